@@ -1,98 +1,162 @@
-from PySide6.QtWidgets import QDialog, QListWidget
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PySide6.QtWidgets import QDialog, QListView
 
 from products import *
 from GUI_popups import DoubleInputPopup, ProductPopup
 from GUI_search_dialog import SearchProductsDialog
 
 
-class ProductTypeListWidget(QListWidget):
-    """ List widget displaying a list of ProductType objects with a lot of useful methods """
+class ProductsModel(QAbstractListModel):
+    """
+    Model of a list of products or product types. The list is not copied, so every change of it has to be made
+    through the model (or in a function passed to it), then only the changed rows are updated in the views
+    """
+    def __init__(self, product_list: list, display=str, parent=None):
+        """
+        :param product_list: Displayed list
+        :param display: Function returning the text displayed for an element of the list
+        :param parent: Set parent of the model
+        """
+        super().__init__(parent)
+        self.product_list = product_list
+        self.display = display
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.product_list)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and 0 <= index.row() < len(self.product_list):
+            return self.display(self.product_list[index.row()])
+        return None
+
+    def set_product_list(self, product_list: list):
+        """ Displays another list """
+        self.beginResetModel()
+        self.product_list = product_list
+        self.endResetModel()
+
+    def insert(self, row: int, insert_function):
+        """ Calls the function, which has to insert one element to the list at given row, and updates the views """
+        self.beginInsertRows(QModelIndex(), row, row)
+        insert_function()
+        self.endInsertRows()
+
+    def remove(self, row: int, remove_function):
+        """ Calls the function, which has to remove the element at given row of the list, and updates the views """
+        self.beginRemoveRows(QModelIndex(), row, row)
+        remove_function()
+        self.endRemoveRows()
+
+    def append(self, element):
+        self.insert(len(self.product_list), lambda: self.product_list.append(element))
+
+    def pop(self, row: int):
+        self.remove(row, lambda: self.product_list.pop(row))
+
+
+class _ProductsView(QListView):
+    """ List view of a ProductsModel, only the visible rows are rendered """
+    def __init__(self, product_list: list, display, parent=None):
+        super().__init__(parent)
+        self.products_model = ProductsModel(product_list, display, self)
+        self.setModel(self.products_model)
+        self.setUniformItemSizes(True)      # Rows are not measured one by one
+        self.setLayoutMode(QListView.LayoutMode.Batched)    # Inserting a row does not lay out the whole list at once
+        self.doubleClicked.connect(self.display_selected_product_info)
+
+    @property
+    def product_list(self) -> list:
+        return self.products_model.product_list
+
+    def current_row(self) -> int:
+        """ Returns index of the selected row, -1 if nothing is selected """
+        index = self.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def set_current_row(self, row: int):
+        self.setCurrentIndex(self.products_model.index(row))
+
+    def display_selected_product_info(self):
+        raise NotImplementedError
+
+
+class ProductTypeListWidget(_ProductsView):
+    """ List view displaying a list of ProductType objects with a lot of useful methods """
     def __init__(self, product_list: list[ProductType], parent=None):
         """
         :param product_list: list of ProductType objects, that will bye displayed
         :param parent: Set parent of the widget
         """
-        super().__init__(parent=parent)
-        self.product_list = product_list
-        self.itemDoubleClicked.connect(self.display_selected_product_info)
-        self.refresh_list()
-
-    def refresh_list(self):
-        """ Updates the content of the widget """
-        self.clear()
-        self.addItems([product.name for product in self.product_list])
+        super().__init__(product_list, lambda product_type: product_type.name, parent)
 
     def display_selected_product_info(self):
         """ Launches a popup for displaying selected product type """
-        if self.currentRow() >= 0:
-            ProductPopup(self.product_list[self.currentRow()], parent=self).exec()
+        if self.current_row() >= 0:
+            ProductPopup(self.product_list[self.current_row()], parent=self).exec()
 
     def delete_selected_product(self):
         """ Deletes selected product type from the list """
-        if self.currentRow() >= 0:
-            self.product_list.pop(self.currentRow())
-            self.refresh_list()
+        if self.current_row() >= 0:
+            self.products_model.pop(self.current_row())
 
     def get_selected(self) -> ProductType | None:
         """ Returns currently selected product type """
-        if self.currentRow() >= 0:
-            return self.product_list[self.currentRow()]
+        if self.current_row() >= 0:
+            return self.product_list[self.current_row()]
         else:
             return None
 
 
-class ProductListWidget(QListWidget):
-    """ List widget displaying a list of Product objects with a lot of useful methods """
-    def __init__(self, product_list: list[Product], parent=None):
+class ProductListWidget(_ProductsView):
+    """ List view displaying a list of Product objects with a lot of useful methods """
+    def __init__(self, product_list: list[Product], parent=None, user=None):
         """
         :param product_list: list of Product objects, that will bye displayed
         :param parent: Set parent of the widget
+        :param user: User whose recent products are offered when adding a product from api
         """
-        super().__init__(parent=parent)
-        self.product_list = product_list
-        self.itemDoubleClicked.connect(self.display_selected_product_info)
-        self.refresh_list()
-
-    def refresh_list(self):
-        """ Updates the content of the widget """
-        self.clear()
-        self.addItems([str(product) for product in self.product_list])
+        super().__init__(product_list, str, parent)
+        self.user = user
 
     def display_selected_product_info(self):
         """ Launches a popup for displaying selected product """
-        if self.currentRow() >= 0:
-            ProductPopup(self.product_list[self.currentRow()].product_type, parent=self).exec()
+        if self.current_row() >= 0:
+            ProductPopup(self.product_list[self.current_row()].product_type, parent=self).exec()
 
     def delete_selected_product(self):
         """ Deletes selected product from the list """
-        if self.currentRow() >= 0:
-            self.product_list.pop(self.currentRow())
-            self.refresh_list()
+        if self.current_row() >= 0:
+            self.products_model.pop(self.current_row())
 
     def add_product_from_api(self):
         """ Launches a dialog for adding a product from api """
-        product_type_dialog = SearchProductsDialog(self)
+        product_type_dialog = SearchProductsDialog(self, self.user)
         if product_type_dialog.exec() == QDialog.DialogCode.Accepted:
             product_type = product_type_dialog.selected_product_type
             self.add_product_by_type(product_type)
 
     def add_product(self, product: Product):
         """ Adds the given product to the list"""
-        self.product_list.append(product)
-        self.refresh_list()
+        self.products_model.append(product)
 
     def add_product_by_type(self, product_type: ProductType):
-        """ Adds a product of given type and weight entered by the user """
+        """ Adds a product of given type and weight entered by the user, counts the use of the product type """
+        product = self.ask_for_product(product_type)
+        if product:
+            SearchProductsDialog.use_product(self.user, product_type)
+            self.add_product(product)
+
+    def ask_for_product(self, product_type: ProductType) -> Product | None:
+        """ Creates a product of given type with weight entered by the user, returns None if user cancelled """
         product_weight_dialog = DoubleInputPopup(parent=self, title=f"Add {product_type.name}",
                                                  label_text="Enter weight:")
         if product_weight_dialog.exec() == QDialog.DialogCode.Accepted:
-            weight = product_weight_dialog.get_value()
-            self.product_list.append(Product(product_type, weight))
-            self.refresh_list()
+            return Product(product_type, product_weight_dialog.get_value())
+        return None
 
     def get_selected(self) -> Product | None:
         """ Returns currently selected product """
-        if self.currentRow() >= 0:
-            return self.product_list[self.currentRow()]
+        if self.current_row() >= 0:
+            return self.product_list[self.current_row()]
         else:
             return None
@@ -1,5 +1,6 @@
 from PySide6.QtGui import QIcon
-from PySide6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QGroupBox, QSpacerItem, QSizePolicy
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QGroupBox, QSpacerItem, QSizePolicy,
+                               QLineEdit)
 
 from user import User
 from products import *
@@ -8,7 +9,10 @@ from GUI_components import ProductTypeListWidget, ProductListWidget
 
 
 class CustomProductsDialog(QDialog):
-    """ Dialog for managing custom products of the user and adding them to eaten list """
+    """
+    Dialog for managing custom products of the user and adding them to eaten list.
+    Typing in the search bar finds products by name among custom products and all the products eaten before
+    """
     def __init__(self, user: User, editable=True, parent=None):
         """
         :param user: User whose custom products will be displayed and managed
@@ -21,6 +25,12 @@ class CustomProductsDialog(QDialog):
         main_layout = QVBoxLayout()
         self.setLayout(main_layout)
 
+        # Setting search bar
+        self.text_search = QLineEdit()
+        self.text_search.setPlaceholderText("Search my products and eaten products")
+        self.text_search.textChanged.connect(self.refresh_list)
+        main_layout.addWidget(self.text_search)
+
         # Setting list widget
         self.current_user = user
         self.list_widget = ProductTypeListWidget(user.get_custom_products())
@@ -55,10 +65,17 @@ class CustomProductsDialog(QDialog):
             self.button_add_combined.clicked.connect(self.add_combined_product_type)
             group_layout.addWidget(self.button_add_combined)
 
+            # Button for correcting selected product type
+            self.button_edit = QPushButton(box_buttons)
+            self.button_edit.setIcon(QIcon(QIcon.fromTheme(u"document-edit")))
+            self.button_edit.setText("edit")
+            self.button_edit.clicked.connect(self.edit_selected_product_type)
+            group_layout.addWidget(self.button_edit)
+
             # Button for removing product from list
             self.button_delete = QPushButton(box_buttons)
             self.button_delete.setIcon(QIcon(QIcon.fromTheme(u"list-remove")))
-            self.button_delete.clicked.connect(self.list_widget.delete_selected_product)
+            self.button_delete.clicked.connect(self.delete_selected_product_type)
             group_layout.addWidget(self.button_delete)
         main_layout.addWidget(box_buttons)
 
@@ -71,13 +88,69 @@ class CustomProductsDialog(QDialog):
         if self.selected_product_type():
             self.accept()
 
+    def refresh_list(self):
+        """ Displays custom products, or products found by the search query if it is given """
+        query = self.text_search.text().strip()
+        if query:
+            self.list_widget.products_model.set_product_list(self.current_user.search_products(query))
+        else:
+            self.list_widget.products_model.set_product_list(self.current_user.get_custom_products())
+
+    def displays_search_results(self) -> bool:
+        return self.list_widget.product_list is not self.current_user.get_custom_products()
+
+    def delete_selected_product_type(self):
+        """ Deletes selected product type from custom products of the user """
+        row = self.list_widget.current_row()
+        selected = self.selected_product_type()
+        custom_products = self.current_user.get_custom_products()
+        if selected is None or selected not in custom_products:
+            return
+        index = custom_products.index(selected)
+        if self.displays_search_results():
+            self.current_user.del_custom_product(index)
+            self.list_widget.products_model.pop(row)
+        else:
+            self.list_widget.products_model.remove(index, lambda: self.current_user.del_custom_product(index))
+
+    def edit_selected_product_type(self):
+        """
+        Launches a popup for correcting selected custom product, combined products containing it are updated.
+        Only the name of a combined product can be changed, its nutrients come from the ingredients
+        """
+        selected = self.selected_product_type()
+        custom_products = self.current_user.get_custom_products()
+        if selected is None or selected not in custom_products:
+            return
+        if selected.ingredients:
+            dialog = StringInputPopup(title="Renaming product", label_text=selected.name, parent=self)
+            if dialog.exec() != QDialog.DialogCode.Accepted:
+                return
+            edited_product = ProductType.combine_products(dialog.get_value(), list(selected.ingredients))
+        else:
+            # Product types are shared, so a copy is edited
+            edited_product = ProductType(selected.name, **selected.nutrients._asdict())
+            if ProductPopup(edited_product, True, self).exec() != QDialog.DialogCode.Accepted:
+                return
+        edited_product.description = selected.description
+        self.current_user.update_custom_product(custom_products.index(selected), edited_product)
+        self.refresh_list()
+
     def add_new_product_type(self):
         """ Launches a product popup for user to enter all the information to create new product type """
         new_product = ProductType("new product")
         dialog = ProductPopup(new_product, True, self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            self.current_user.add_custom_product(new_product)
-            self.list_widget.refresh_list()
+            self.add_custom_product_type(new_product)
+
+    def add_custom_product_type(self, product_type: ProductType):
+        """ Adds product type to custom products of the user, displaying it at the end of the list """
+        if self.displays_search_results():
+            self.current_user.add_custom_product(product_type)
+            self.list_widget.products_model.append(self.current_user.get_custom_products()[-1])
+        else:
+            self.list_widget.products_model.insert(len(self.list_widget.product_list),
+                                                   lambda: self.current_user.add_custom_product(product_type))
 
     def add_combined_product_type(self):
         """ Launches a dialog for creating a list of products and combines them into one product type """
@@ -87,8 +160,7 @@ class CustomProductsDialog(QDialog):
             get_name_dialog = StringInputPopup(title="Creating product", label_text="Enter product name", parent=self)
             if get_name_dialog.exec() == QDialog.DialogCode.Accepted:
                 combined_product_type = ProductType.combine_products(get_name_dialog.get_value(), dialog.created_list)
-                self.current_user.add_custom_product(combined_product_type)
-                self.list_widget.refresh_list()
+                self.add_custom_product_type(combined_product_type)
 
 
 class ProductListDialog(QDialog):
@@ -107,7 +179,7 @@ class ProductListDialog(QDialog):
         # Setting list widget
         self.current_user = user
         self.created_list: list[Product] = []
-        self.list_widget = ProductListWidget(self.created_list, self)
+        self.list_widget = ProductListWidget(self.created_list, self, user)
         main_layout.addWidget(self.list_widget)
 
         # Setting buttons
@@ -148,4 +220,3 @@ class ProductListDialog(QDialog):
         dialog = CustomProductsDialog(self.current_user, parent=self, editable=False)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             self.list_widget.add_product_by_type(dialog.selected_product_type())
-            self.list_widget.refresh_list()
@@ -1,11 +1,24 @@
 from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QGroupBox, QHBoxLayout, QLabel, QFrame, QComboBox
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import seaborn as sns
+import math
+import time
 
-from user import User, current_date
+from days import today
+from user import User
 from products import Nutrients
 
+MAX_DAYS = 30                   # Maximal number of days displayed on the graph
+FRAME_BUDGET_MS = 1000 / 60     # Redrawing the graph should not take longer than one frame
+
+
+def _rounded_up(value: float) -> float:
+    """ Rounds the value up to a round number, so the axis does not change with every small change of the data """
+    if value <= 0:
+        return 1.0
+    power = 10 ** math.floor(math.log10(value))
+    return next(step * power for step in (1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10) if step * power >= value)
+
 
 class MplCanvas(FigureCanvas):
     """ Matplotlib canvas, that can be displayed in the Pyside6 window """
@@ -16,18 +29,39 @@ class MplCanvas(FigureCanvas):
 
 
 class GraphWindow(QMainWindow):
-    """ Window for displaying a graph with selected nutrient consumption for given user """
-    def __init__(self, user: User, parent=None):
+    """
+    Window for displaying a graph with selected nutrient consumption for given user.
+    Daily series are cached until the user data changes. Bars of the graph are created once for a number of days and
+    then only their heights are changed, the parts of the figure, that did not change, are not drawn again (blitting)
+    """
+    def __init__(self, user: User, parent=None, use_seaborn=False):
         """
         :param user: User, whose consumption will be displayed
         :param parent:  Set parent of the widget
+        :param use_seaborn: If True, the graph is drawn from scratch with seaborn at every change
         """
         super().__init__(parent)
         self.setWindowTitle(f"Consumption of user {user.name}")
         self.user = user
+        self.use_seaborn = use_seaborn
+        self.redraw_times: list[float] = []     # Durations of redrawing the graph in milliseconds
+
+        # Cached history of the last MAX_DAYS days and series of single nutrients taken from it
+        self._history = None
+        self._history_key = None                # (user data revision, today) of the cached history
+        self._series = {}
+
+        # Artists of the pure matplotlib graph, updated in place
+        self._bars = None
+        self._limit_line = None
+        self._ppm_line = None
+        self._background = None                 # Canvas without animated artists, restored when blitting
+        self._axis_background = None            # Background with the y-axis drawn in the _axis_state
+        self._axis_state = None                 # (label, limits) of the y-axis in the _axis_background
 
         # Create the Matplotlib canvas
         self.canvas = MplCanvas(width=10, height=8, dpi=100)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
 
         # Set the central widget
         central_widget = QWidget()
@@ -63,7 +97,7 @@ class GraphWindow(QMainWindow):
 
         # ComboBox for number of days
         self.days_combobox = QComboBox()
-        self.days_combobox.addItems([str(i) for i in range(3, 31)])
+        self.days_combobox.addItems([str(i) for i in range(3, MAX_DAYS + 1)])
         self.days_combobox.currentTextChanged.connect(self.print_graph)
         group_layout.addWidget(self.days_combobox)
 
@@ -73,37 +107,153 @@ class GraphWindow(QMainWindow):
 
         layout.addWidget(group_box)
 
-        # Generate a Seaborn plot and draw it on the canvas
         self.print_graph()
 
+    def nutrient_series(self, nutrient: str, days_count: int):
+        """ Returns amounts of the nutrient eaten at the last days_count days, the last value is for today """
+        key = (self.user.revision, today())
+        if key != self._history_key:
+            self._history = self.user.nutrients_history(today() + 1 - MAX_DAYS, today())
+            self._history_key = key
+            self._series.clear()
+        if nutrient not in self._series:
+            self._series[nutrient] = self._history.amounts[:, Nutrients._fields.index(nutrient)]
+        return self._series[nutrient][MAX_DAYS - days_count:]
+
+    def reference_lines(self, nutrient: str) -> list[tuple[float, str, str]]:
+        """ Returns (value, color, label) of the limit and PPM lines displayed for the nutrient, (None, ...) if absent """
+        limit_value = self.user.limits[Nutrients._fields.index(nutrient)]
+        ppm = self.user.get_ppm if nutrient == "nf_calories" else None
+        return [(limit_value if limit_value else None, 'red', f'Limit: {limit_value or 0:.2f}'),
+                (ppm, 'green', f'PPM: {ppm or 0:.2f}')]
+
     def print_graph(self):
         """ Printing a graph onto the canvas """
-        # Generating data
-        nutrient_label = f"{self.nutrient_combobox.currentText()} (g)"
-        nutrient_history = {
-            "day ago": [],
-            nutrient_label: []
-        }
-        nutrient_idx = Nutrients._fields.index(self.nutrient_combobox.currentText())
-        for days in reversed(range(int(self.days_combobox.currentText()))):
-            iteration_date = current_date().addDays(-days)
-            nutrient_history["day ago"].append(days)
-            nutrient_history[nutrient_label].append(self.user.count_nutrients(nutrient_idx, iteration_date)[0])
+        start = time.perf_counter()
+        nutrient = self.nutrient_combobox.currentText()
+        series = self.nutrient_series(nutrient, int(self.days_combobox.currentText()))
+        if self.use_seaborn:
+            self._print_seaborn_graph(nutrient, series)
+        elif self._bars is None or len(self._bars) != len(series):
+            self._create_bars(nutrient, series)
+        else:
+            self._update_bars(nutrient, series)
+        self.redraw_times.append((time.perf_counter() - start) * 1000)
 
+    def refresh(self):
+        """ Updates the graph, if the user data changed since it was printed """
+        if self._history_key != (self.user.revision, today()):
+            self.print_graph()
+
+    def _print_seaborn_graph(self, nutrient: str, series):
+        import seaborn as sns
+        nutrient_label = f"{nutrient} (g)"
+        nutrient_history = {"day ago": list(reversed(range(len(series)))), nutrient_label: series}
+        self._bars = None
         self.canvas.axes.cla()
 
         # Adding graph
         sns.barplot(x="day ago", y=nutrient_label, data=nutrient_history, ax=self.canvas.axes)
 
         # Adding lines for limit and ppm
-        limit_value = self.user.limits[nutrient_idx]
-        if limit_value > 0:
-            self.canvas.axes.axhline(limit_value, color='red', linestyle='--', linewidth=2,
-                                     label=f'Limit: {limit_value:.2f}')
-        if self.nutrient_combobox.currentText() == "nf_calories" and self.user.get_ppm:
-            self.canvas.axes.axhline(self.user.get_ppm, color='green', linestyle='--', linewidth=2,
-                                     label=f'PPM: {self.user.get_ppm:.2f}')
+        for value, color, label in self.reference_lines(nutrient):
+            if value is not None:
+                self.canvas.axes.axhline(value, color=color, linestyle='--', linewidth=2, label=label)
 
         # Printing
         self.canvas.axes.set_ylim(bottom=0)
         self.canvas.draw()
+
+    def _create_bars(self, nutrient: str, series):
+        """
+        Creates the bars for a number of days. Bars, lines and the y-axis are animated artists, so only they are drawn
+        again when the nutrient or the data changes, the rest of the figure is restored from the background
+        """
+        axes = self.canvas.axes
+        if self._bars is None:
+            axes.cla()
+            axes.set_xlabel("day ago")
+            axes.yaxis.set_animated(True)
+            self._limit_line = axes.axhline(0, color='red', linestyle='--', linewidth=2, animated=True)
+            self._ppm_line = axes.axhline(0, color='green', linestyle='--', linewidth=2, animated=True)
+        else:
+            self._bars.remove()
+        positions = range(len(series))
+        self._bars = axes.bar(positions, series, color="C0", animated=True)
+        axes.set_xticks(positions, [str(len(series) - 1 - position) for position in positions])
+        axes.set_xlim(-0.5, len(series) - 0.5)
+        self._background = None
+        self._update_bars(nutrient, series)
+
+    def _update_bars(self, nutrient: str, series):
+        """ Changes the heights of bars and lines and the range of the y-axis, then draws them on the background """
+        for bar, value in zip(self._bars, series):
+            bar.set_height(value)
+        top = max(series.max(initial=0), 0)
+        for line, (value, _, label) in zip((self._limit_line, self._ppm_line), self.reference_lines(nutrient)):
+            line.set_visible(value is not None)
+            if value is not None:
+                line.set_ydata([value, value])
+                line.set_label(label)
+                top = max(top, value)
+        self.canvas.axes.set_ylabel(f"{nutrient} (g)")
+        self.canvas.axes.set_ylim(0, _rounded_up(top * 1.05))
+        if self._background is None:
+            self.canvas.draw()
+        else:
+            self._draw_animated()
+
+    def _on_draw(self, event):
+        """ After every full draw remembers the background and draws animated artists on it """
+        if self._bars is not None:
+            self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+            self._axis_state = None
+            self._draw_animated()
+
+    def _draw_animated(self):
+        """ Draws animated artists on the background, the y-axis is drawn only if its label or limits changed """
+        axes = self.canvas.axes
+        axis_state = (axes.get_ylabel(), axes.get_ylim())
+        if axis_state != self._axis_state:
+            self.canvas.restore_region(self._background)
+            axes.draw_artist(axes.yaxis)
+            self._axis_background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+            self._axis_state = axis_state
+        else:
+            self.canvas.restore_region(self._axis_background)
+        for artist in [*self._bars, self._limit_line, self._ppm_line]:
+            axes.draw_artist(artist)
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    import os
+    import statistics
+    import sys
+    import tempfile
+    from PySide6.QtWidgets import QApplication
+    from storage import JournalStorage
+    from products import ProductType, Product
+
+    app = QApplication(sys.argv)
+    test_user = User("graph test", JournalStorage(os.path.join(tempfile.mkdtemp(), "graph_test_data.pkl")))
+    for offset in range(MAX_DAYS):
+        test_user.add_eaten_product(Product(ProductType("bread", nf_calories=250, nf_protein=8), 100 + 10 * offset),
+                                    today() - offset)
+    for seaborn in (True, False):
+        window = GraphWindow(test_user, use_seaborn=seaborn)
+        window.show()
+        app.processEvents()
+        window.redraw_times.clear()
+        for nutrient in Nutrients._fields[:4] * 3:
+            window.nutrient_combobox.setCurrentText(nutrient)
+        switch_times = window.redraw_times[:]
+        window.redraw_times.clear()
+        for _ in range(10):
+            test_user.add_eaten_product(Product(ProductType("apple", nf_calories=52, nf_protein=0.3), 1))
+            window.refresh()
+        print(f"{'seaborn' if seaborn else 'matplotlib'}: median redraw {statistics.median(switch_times):.1f} ms "
+              f"after nutrient change, {statistics.median(window.redraw_times):.1f} ms after data change "
+              f"(frame budget {FRAME_BUDGET_MS:.1f} ms)")
+        window.close()
@@ -1,27 +1,54 @@
 from PySide6.QtWidgets import QApplication, QMainWindow
-from PySide6.QtUiTools import QUiLoader
 from PySide6.QtGui import QAction
-from PySide6.QtCore import QFile, QIODeviceBase
+from PySide6.QtCore import QDate, QFile, QIODeviceBase
+import os
 import sys
 
+import days
+import storage
 from GUI_popups import *
 from GUI_search_dialog import SearchProductsDialog
 from GUI_custom_products_dialogs import CustomProductsDialog
 from GUI_components import ProductListWidget
-from GUI_graph_window import GraphWindow
+from user_cache import UserCache
+
+
+def load_ui(compiled: bool = True) -> QMainWindow:
+    """
+    Creates the widget described by the main_window.ui file. The module compiled from it by build_ui.py is used,
+    if it is up to date. Otherwise the .ui file is parsed by QUiLoader
+
+    :param compiled: If False, the .ui file is always parsed
+    """
+    import build_ui
+    module = build_ui.compiled_module("main_window.ui") if compiled else None
+    if module is not None:
+        widget = QMainWindow()
+        form = module.Ui_MainWindow()
+        form.setupUi(widget)
+        # Child widgets are accessible as attributes, like in the widget created by QUiLoader
+        for name, child in vars(form).items():
+            setattr(widget, name, child)
+        return widget
+    from PySide6.QtUiTools import QUiLoader
+    file = QFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_window.ui"))
+    file.open(QIODeviceBase.ReadOnly)
+    widget = QUiLoader().load(file)
+    file.close()
+    return widget
 
 
 class MyMainWindow(QMainWindow):
     """ Main window of the app, mostly loaded from the main_window.ui file """
-    def __init__(self):
+    def __init__(self, compiled_ui: bool = True, preload_users: bool = True):
+        """
+        :param compiled_ui: If False, main_window.ui is parsed even if its compiled module is up to date
+        :param preload_users: If True, other users are loaded in the background, so that switching to them is instant
+        """
         super().__init__()
 
-        # Loading ui from the .ui file
-        loader = QUiLoader()
-        file = QFile("main_window.ui")
-        file.open(QIODeviceBase.ReadOnly)
-        self.ui = loader.load(file)
-        file.close()
+        # Loading ui
+        self.ui = load_ui(compiled_ui)
         self.setWindowTitle(self.ui.windowTitle())
         self.resize(366, 508)
         self.setCentralWidget(self.ui)
@@ -34,7 +61,7 @@ class MyMainWindow(QMainWindow):
         self.setup_users_menu()
 
         # Setting up statistics menu
-        self.ui.action_graph.triggered.connect(lambda: GraphWindow(self.current_user, self).show())
+        self.ui.action_graph.triggered.connect(self.show_graph_window)
         self.ui.action_set_parameters.triggered.connect(lambda: UserParamsInputPopup(self.current_user, self).exec())
         self.ui.action_set_limits.triggered.connect(lambda: UserLimitsPopup(self.current_user, self).exec())
 
@@ -42,19 +69,36 @@ class MyMainWindow(QMainWindow):
         self.eaten_list_widget = ProductListWidget([], self)
         self.ui.list_widget_container.layout().addWidget(self.eaten_list_widget)
 
-        # Selecting a user
+        # Graph window opened last, it is updated when eaten products change
+        self.graph_window = None
+
+        # Selecting the user used last time. Users are kept in a cache, so switching back to them does not load them
+        self.user_cache = UserCache()
+        self.preload_users = preload_users
         self.current_user: user.User = None
-        self.select_user(0)
+        last_used = user.last_used_user()
+        self.select_user(self.users.index(last_used) if last_used in self.users else 0)
 
         # Setting up date widget
         self.ui.date_select.dateChanged.connect(self.new_date_selected)
-        self.ui.date_select.setMaximumDate(user.current_date())
+        self.ui.date_select.setMaximumDate(QDate.currentDate())
 
         # Setting up buttons
         self.ui.button_delete.clicked.connect(self.delete_selected_product)
         self.ui.button_add.clicked.connect(self.add_eaten_product)
         self.ui.button_my_products.clicked.connect(self.add_eaten_custom_product)
 
+    def show_graph_window(self):
+        """ Opens a window with graphs of the current user """
+        from GUI_graph_window import GraphWindow    # matplotlib and seaborn are loaded only when needed
+        self.graph_window = GraphWindow(self.current_user, self)
+        self.graph_window.show()
+
+    def refresh_graph_window(self):
+        """ Updates the opened graph window, if the data of its user changed """
+        if self.graph_window is not None and self.graph_window.isVisible():
+            self.graph_window.refresh()
+
     def setup_users_menu(self):
         """ Redoes the user menu - clears it and adds all users from the list """
         self.user_actions.clear()
@@ -84,13 +128,27 @@ class MyMainWindow(QMainWindow):
         if not other_selected:
             self.user_actions[user_idx].setChecked(True)
             return
+        # The new user is opened first, so if opening fails, the current one stays selected
+        new_user = self.user_cache.get(self.users[user_idx])
         for action in self.user_actions:
             action.setChecked(False)
         self.user_actions[user_idx].setChecked(True)
-        self.current_user = user.User(self.users[user_idx])
-        self.ui.date_select.setDate(user.current_date())
+        if self.current_user is not None and self.current_user is not new_user:
+            self.user_cache.put(self.current_user)
+        self.current_user = new_user
+        self.current_user.update_manifest(used=True)
+        if self.preload_users:
+            others = dict.fromkeys(user.recently_used_users() + self.users)
+            others.pop(self.current_user.name, None)
+            self.user_cache.preload(list(others))
+        self.ui.date_select.setDate(QDate.currentDate())
         self.refresh_eaten_info()
 
+    def closeEvent(self, event):
+        """ Writes changes of the current user before closing the window """
+        self.current_user.close()
+        super().closeEvent(event)
+
     def add_user(self):
         """ Adds a new user to the list, takes care of everything that should be updated """
         dialog = StringInputPopup(title="Add user", label_text="Ener user name", parent=self)
@@ -102,7 +160,11 @@ class MyMainWindow(QMainWindow):
 
     def is_date_recent(self, max_days_ago: int = 0) -> bool:
         """ Returns True if current date is selected """
-        return self.ui.date_select.date() >= user.current_date().addDays(-max_days_ago)
+        return self.selected_day() >= days.today() - max_days_ago
+
+    def selected_day(self) -> days.Day:
+        """ Returns the day selected in the date widget """
+        return self.ui.date_select.date().toJulianDay()
 
     def new_date_selected(self):
         """ Takes care of everything, that should be updated after changing a date """
@@ -113,14 +175,14 @@ class MyMainWindow(QMainWindow):
 
     def refresh_eaten_info(self):
         """ Updates every information about eaten products """
-        self.eaten_list_widget.product_list = self.current_user.get_eaten_products(self.ui.date_select.date())
-        self.eaten_list_widget.refresh_list()
+        self.eaten_list_widget.products_model.set_product_list(
+            self.current_user.get_eaten_products(self.selected_day()))
         self.display_calories_sum()
 
     def display_calories_sum(self):
         """ Displays total value of calories at the selected day """
         calories, correct = self.current_user.count_nutrients(
-            Nutrients._fields.index("nf_calories"), self.ui.date_select.date())
+            Nutrients._fields.index("nf_calories"), self.selected_day())
         if correct:
             self.ui.text_calories.setText(f"{calories:.2f} kcal")
         else:
@@ -128,30 +190,43 @@ class MyMainWindow(QMainWindow):
 
     def add_eaten_product(self):
         """ Launches a dialog, that allows the user to add a product from api to eaten list"""
-        product_type_dialog = SearchProductsDialog(self)
+        product_type_dialog = SearchProductsDialog(self, self.current_user)
         if product_type_dialog.exec() == QDialog.DialogCode.Accepted:
             product_type = product_type_dialog.selected_product_type
-            self.eaten_list_widget.add_product_by_type(product_type)
-            self.display_calories_sum()
-            self.current_user.save_data()
+            self.add_eaten_product_by_type(product_type)
 
     def add_eaten_custom_product(self):
         """ Launches a dialog, that allows the user to manage his own products and to add one of them to eaten list"""
         product_type_dialog = CustomProductsDialog(self.current_user, self)
         if product_type_dialog.exec() == QDialog.DialogCode.Accepted:
             product_type = product_type_dialog.selected_product_type()
-            self.eaten_list_widget.add_product_by_type(product_type)
+            self.add_eaten_product_by_type(product_type)
+
+    def add_eaten_product_by_type(self, product_type: ProductType):
+        """ Asks the user for the weight and adds a product of given type to eaten list at the selected date """
+        product = self.eaten_list_widget.ask_for_product(product_type)
+        if product:
+            self.current_user.use_product(product_type)
+            date = self.selected_day()
+            self.eaten_list_widget.products_model.insert(len(self.eaten_list_widget.product_list),
+                                                         lambda: self.current_user.add_eaten_product(product, date))
             self.display_calories_sum()
-            self.current_user.save_data()
+            self.refresh_graph_window()
 
     def delete_selected_product(self):
-        self.eaten_list_widget.delete_selected_product()
-        self.display_calories_sum()
+        """ Deletes selected product from eaten list at the selected date """
+        row = self.eaten_list_widget.current_row()
+        if row >= 0:
+            date = self.selected_day()
+            self.eaten_list_widget.products_model.remove(row, lambda: self.current_user.del_eaten_product(row, date))
+            self.display_calories_sum()
+            self.refresh_graph_window()
 
 
 def run():
     """ Launches the application """
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(storage.flush_all)     # Mutations are written in the background
     main_window = MyMainWindow()
     main_window.show()
     sys.exit(app.exec())
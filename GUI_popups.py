@@ -42,6 +42,9 @@ class ProductPopup(QDialog):
                 self.spinbox_nutrients[-1].setValue(0)
             else:
                 self.spinbox_nutrients[-1].setValue(product_type.nutrients[idx])
+            if product_type.partial_nutrients and product_type.partial_nutrients[idx]:
+                # Combined product, which ingredients do not all have this nutrient given
+                self.spinbox_nutrients[-1].setPrefix("at least ")
             layout.addRow(nutrient, self.spinbox_nutrients[-1])
 
         # Setting ok button
@@ -1,21 +1,42 @@
+from PySide6.QtCore import QTimer
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QGroupBox, QListWidget, QLineEdit, QLabel
+from collections import OrderedDict
 
 from products import *
+from recent_products import RecentProducts
+from user import User
 from GUI_popups import ProductPopup
-import api_handler
+from GUI_workers import LatestTask
+
+
+def _matches(product: dict, query: str) -> bool:
+    """ Checks if every word of the query is a part of the product name """
+    name = product["food_name"].lower()
+    return all(word in name for word in query.lower().split())
 
 
 class SearchProductsDialog(QDialog):
-    """ Dialog for finding a product type using the api """
-    recent_products: list[ProductType] = []
+    """
+    Dialog for finding a product type using the api. Search starts when user stops typing, api requests are sent
+    in the background. Results of previous searches are reused: if the query extends a query already searched for,
+    its results are filtered locally, and if they came from the api and were not limited by it, no request is sent.
+    Before searching, product types recently added by the user are displayed, they are available without requests.
+    """
+    session_recent_products = RecentProducts()     # Recent products used when the dialog is not opened for a user
+    search_delay = 300          # Time in milliseconds from the last edit of the query to the start of search
+    max_cached_searches = 100
+    prefetch_count = 5          # Number of top search results, which product info is downloaded in advance
+    found_products_cache: OrderedDict[str, 'SearchResults'] = OrderedDict()    # Results of the previous searches
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, user: User = None):
         """
         :param parent: Set parent of the widget
+        :param user: User whose recent products are displayed and updated
         """
         super().__init__(parent=parent)
         self.selected_product_type: ProductType = None
+        self.user = user
 
         self.setWindowTitle(f"Find product")
         self.resize(400, 300)
@@ -26,6 +47,7 @@ class SearchProductsDialog(QDialog):
         group_box = QGroupBox("Search")
         group_layout = QHBoxLayout(group_box)
         self.text_search = QLineEdit("")            # input
+        self.text_search.textEdited.connect(self.query_edited)
         group_layout.addWidget(self.text_search)
         self.button_search = QPushButton()          # button
         self.button_search.setIcon(QIcon.fromTheme("edit-find"))
@@ -40,8 +62,22 @@ class SearchProductsDialog(QDialog):
         self.list_widget.itemDoubleClicked.connect(self.display_selected_product_info)
         main_layout.addWidget(self.list_widget)
 
+        # Setting background api requests
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.search_delay)
+        self.search_timer.timeout.connect(self.search)
+        self.search_query = ""      # Query of the search in progress
+        self.search_task = LatestTask(self)
+        self.search_task.finished.connect(self.search_finished)
+        self.nutrition_task = LatestTask(self)
+        self.nutrition_task.finished.connect(self.product_info_received)
+        self.product_type_callback = None   # Function called with the product type, when its info is received
+        self.prefetch_cancelled = None      # Event cancelling prefetching of found products info
+
         # Initialization of important variables
         self.found_products = []
+        self.recent_list: list[ProductType] = []   # Displayed recent products
         self.displaying_recent = True   # Indicates whether the widget is currently displaying 'recent products'
         self.display_recent()
 
@@ -52,45 +88,168 @@ class SearchProductsDialog(QDialog):
 
     def display_selected_product_info(self):
         """ Launches a popup with all the information about selected product """
-        selected_product_type = self.get_selected_product_type()
-        if selected_product_type:
-            ProductPopup(selected_product_type, parent=self).exec()
+        self.request_selected_product_type(lambda product_type: ProductPopup(product_type, parent=self).exec())
 
     def display_recent(self):
         """ Displays recently browsed products """
         self.displaying_recent = True
         self.label_widget_title.setText("Recent products")
         self.list_widget.clear()
-        recent_names = [product.name for product in SearchProductsDialog.recent_products]
-        self.list_widget.addItems(reversed(recent_names))
+        self.recent_list = self.recent_products.most_recent()
+        self.list_widget.addItems([product_type.name for product_type in self.recent_list])
+
+    @property
+    def recent_products(self) -> RecentProducts:
+        return self.user.recent_products if self.user else SearchProductsDialog.session_recent_products
+
+    @staticmethod
+    def use_product(user: User | None, product_type: ProductType):
+        """ Marks product type as recently used by the user, or in this session if there is no user """
+        if user:
+            user.use_product(product_type)
+        else:
+            SearchProductsDialog.session_recent_products.use(product_type)
+
+    def query_edited(self):
+        """ Shows what can be found without a request at once, the search starts after the user stops typing """
+        self.search_timer.start()
+        query = self.text_search.text().strip()
+        found_products = self._cached_results(query)[0] if query else None
+        if found_products is not None:
+            self.display_found_products(found_products)
 
     def search(self):
-        """ Sends an api request based on user input and displays received products in the widget """
-        if self.text_search.text() == "":
+        """ Finds products based on user input and displays them in the widget, sends api request only if needed """
+        import api_handler      # Loaded on the first search, it imports the requests library
+        self.search_timer.stop()
+        query = self.text_search.text().strip()
+        if query == "":
+            self.cancel_search()
             self.display_recent()
             return
-        self.found_products = api_handler.search_food(self.text_search.text())
+        if self.search_task.in_flight and query == self.search_query:
+            return
+        found_products, complete = self._cached_results(query)
+        if found_products is not None:
+            self.display_found_products(found_products)
+        if complete:
+            self.cancel_search()
+            self.prefetch_found_products()
+            return
+        self.search_query = query
+        self.cancel_prefetch()
+        self.search_task.start(api_handler.search_food, query)
+        self.displaying_recent = False
+        self.label_widget_title.setText("Searching...")
+        if found_products is None:
+            self.found_products = []
+            self.list_widget.clear()
+
+    def _cached_results(self, query: str) -> tuple[list[dict] | None, bool]:
+        """
+        Finds products for the query in results of the previous searches
+
+        :return: tuple in a form (found_products, complete) where:
+            found_products - list of products matching the query, None if there are no results to filter
+            complete - True if api would not return any other products
+        """
+        import api_handler
+        cache = SearchProductsDialog.found_products_cache
+        if query in cache:
+            cache.move_to_end(query)
+            return cache[query].products, cache[query].remote
+        prefixes = [prefix for prefix in cache if query.startswith(prefix)]
+        if not prefixes:
+            return None, False
+        results = cache[max(prefixes, key=len)]
+        found_products = [product for product in results.products if _matches(product, query)]
+        # Products missing in the local database may be found by the api
+        return found_products, results.remote and len(results.products) < api_handler.search_results_limit
+
+    def cancel_search(self):
+        """ Ignores results of the search in progress """
+        if self.search_task.in_flight:
+            self.search_task.cancel()
+            self.label_widget_title.setText("Search results" if not self.displaying_recent else "Recent products")
+
+    def search_finished(self, results: 'SearchResults | None'):
+        """ Saves found products for the future searches and displays them, results are None if the search failed """
+        found_products = results.products if results else []
+        if found_products:
+            SearchProductsDialog.found_products_cache[self.search_query] = results
+            while len(SearchProductsDialog.found_products_cache) > self.max_cached_searches:
+                SearchProductsDialog.found_products_cache.popitem(last=False)
+        self.display_found_products(found_products)
+        self.prefetch_found_products()
+
+    def display_found_products(self, found_products: list[dict]):
+        """ Displays found products, info of the previously displayed ones is not downloaded anymore """
         self.displaying_recent = False
+        self.found_products = found_products
         self.label_widget_title.setText("Search results")
         self.list_widget.clear()
         self.list_widget.addItems([product["food_name"] for product in self.found_products])
+        self.cancel_prefetch()
+
+    def prefetch_found_products(self):
+        """
+        Starts downloading info of the top displayed products in the background. Called only when the search is done,
+        not while the user is typing, so every keystroke does not cost api requests
+        """
+        import api_handler
+        self.cancel_prefetch()
+        top_products = self.found_products[:self.prefetch_count]
+        self.prefetch_cancelled = api_handler.prefetch_nutrition([product["nix_item_id"] for product in top_products])
+
+    def cancel_prefetch(self):
+        """ Stops downloading info of found products, which has not been started yet """
+        if self.prefetch_cancelled:
+            self.prefetch_cancelled.set()
+            self.prefetch_cancelled = None
+
+    def done(self, result: int):
+        """ Cancels background work and closes the dialog """
+        self.cancel_prefetch()
+        self.search_task.cancel()
+        self.nutrition_task.cancel()
+        super().done(result)
 
     def add_selected_product(self):
         """ Sets the outcome variable and closes the dialog window with Accept code """
-        self.selected_product_type = self.get_selected_product_type()
-        if self.selected_product_type:
+        def accept_product_type(product_type: ProductType):
+            self.selected_product_type = product_type
             self.accept()
+        self.request_selected_product_type(accept_product_type)
 
-    def get_selected_product_type(self) -> ProductType | None:
-        """ Returns ProductType object based on user selection """
+    def request_selected_product_type(self, callback):
+        """
+        Gets ProductType object based on user selection, downloading its info in the background if needed
+
+        :param callback: Function called with the product type, not called if nothing is selected
+        """
+        import api_handler
         idx = self.list_widget.currentRow()
         if idx < 0:
-            return None
+            return
         if self.displaying_recent:
-            return SearchProductsDialog.recent_products[~idx]
+            callback(self.recent_list[idx])
+            return
+        self.product_type_callback = callback
+        item_id = self.found_products[idx]["nix_item_id"]
+        food_info = api_handler.get_cached_nutrition_by_id(item_id)
+        if food_info:
+            self.product_info_received(food_info)
         else:
-            food_id = self.found_products[idx]["nix_item_id"]
-            food_info = api_handler.get_nutrition_by_id(food_id)
-            product_type = ProductType(food_info['food_name'], **food_info)
-            self.recent_products.append(product_type)
-            return product_type
+            self.nutrition_task.start(api_handler.get_nutrition_by_id, item_id)
+            self.button_add.setEnabled(False)
+            self.label_widget_title.setText("Downloading product info...")
+
+    def product_info_received(self, food_info: dict | None):
+        """ Creates ProductType out of received info and passes it to the waiting callback """
+        self.button_add.setEnabled(True)
+        self.label_widget_title.setText("Search results")
+        if not food_info:
+            self.label_widget_title.setText("Downloading product info failed")
+            return
+        product_type = intern_product_type(ProductType(food_info['food_name'], **food_info))
+        self.product_type_callback(product_type)
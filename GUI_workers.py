@@ -0,0 +1,74 @@
+from PySide6.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, Signal
+import threading
+
+
+class _TaskSignals(QObject):
+    """ Signals of the Task, QRunnable can not have its own signals """
+    finished = Signal(int, object)      # id of the task, result of the function
+
+
+class Task(QRunnable):
+    """ Runs a function in the thread pool and emits its result. If the function raises, the result is None """
+    def __init__(self, task_id: int, cancelled: threading.Event, function, *args):
+        """
+        :param task_id: Identifier emitted together with the result
+        :param cancelled: Event set when the result is not needed anymore, then the function is not called at all
+        :param function: Function to be called
+        :param args: Arguments of the function
+        """
+        super().__init__()
+        self.task_id = task_id
+        self.cancelled = cancelled
+        self.function = function
+        self.args = args
+        self.signals = _TaskSignals()
+
+    def run(self):
+        result = None
+        if not self.cancelled.is_set():
+            try:
+                result = self.function(*self.args)
+            except Exception as e:
+                print(f"Error: {e}")
+        if not QCoreApplication.closingDown():     # Objects receiving the result may be already deleted
+            self.signals.finished.emit(self.task_id, result)
+
+
+class LatestTask(QObject):
+    """ Runs tasks of one kind in the background, only the result of the most recently started one is used """
+    started = Signal()
+    finished = Signal(object)           # Result of the latest task
+
+    def __init__(self, parent=None):
+        """
+        :param parent: Set parent of the object, results are not delivered after the parent is deleted
+        """
+        super().__init__(parent)
+        self._task_id = 0
+        self._cancelled = threading.Event()
+        self._running: dict[int, Task] = {}     # Started tasks by their ids, kept until their results are delivered
+        self.in_flight = False
+
+    def start(self, function, *args):
+        """ Calls the function with given arguments in the background, cancelling the previous task """
+        self.cancel()
+        self._task_id += 1
+        task = Task(self._task_id, self._cancelled, function, *args)
+        task.signals.finished.connect(self._task_finished)
+        self._running[self._task_id] = task
+        self.in_flight = True
+        self.started.emit()
+        QThreadPool.globalInstance().start(task)
+
+    def cancel(self):
+        """ Ignores the result of the running task and prevents it from starting if it is still queued """
+        self._cancelled.set()
+        self._cancelled = threading.Event()
+        self._task_id += 1
+        self.in_flight = False
+
+    def _task_finished(self, task_id: int, result):
+        self._running.pop(task_id, None)
+        if task_id == self._task_id:
+            self.in_flight = False
+            self.finished.emit(result)
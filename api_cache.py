@@ -0,0 +1,145 @@
+from collections import OrderedDict, namedtuple
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+CacheStats = namedtuple("CacheStats", ['hits', 'misses', 'entries', 'size'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used);
+"""
+
+
+class ResponseCache:
+    """
+    Persistent cache of api responses, stored as compressed json in an SQLite database.
+    Entries expire after ttl seconds, least recently used entries are evicted when the size of stored values exceeds
+    max_size bytes. Recently used responses are also kept decoded in memory.
+    """
+    def __init__(self, filename: str, ttl: float = 7 * 24 * 3600, max_size: int = 50 * 2**20,
+                 memory_entries: int = 256):
+        """
+        :param filename: Name of the database file
+        :param ttl: Time in seconds after which the response has to be downloaded again
+        :param max_size: Maximal total size of the compressed responses in bytes
+        :param memory_entries: Number of responses kept decoded in memory
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.max_size = max_size
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, object]] = OrderedDict()   # key -> (created, response)
+        self._connection: sqlite3.Connection | None = None
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def _db(self) -> sqlite3.Connection:
+        """ Returns connection to the database, opens it on the first use """
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+            self._size = self._connection.execute("SELECT TOTAL(LENGTH(value)) FROM responses").fetchone()[0]
+        return self._connection
+
+    @staticmethod
+    def key(url: str, params: dict) -> str:
+        """ Returns the cache key of a request """
+        return url + "?" + json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, url: str, params: dict):
+        """ Returns cached response for the request, None if it is not cached or expired """
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                created, response = self._memory[key]
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+            row = self._db().execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.misses += 1
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            response = json.loads(zlib.decompress(row[0]))
+            self._remember(key, row[1], response)
+            self.hits += 1
+            return response
+
+    def put(self, url: str, params: dict, response):
+        """ Saves the response of the request """
+        key = self.key(url, params)
+        value = zlib.compress(json.dumps(response).encode())
+        now = time.time()
+        with self._lock, self._db():
+            old_row = self._connection.execute("SELECT LENGTH(value) FROM responses WHERE key = ?", (key,)).fetchone()
+            self._size -= old_row[0] if old_row else 0
+            self._connection.execute("INSERT OR REPLACE INTO responses (key, value, created, last_used) "
+                                     "VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self._size += len(value)
+            self._remember(key, now, response)
+            self._evict(now)
+
+    def _remember(self, key: str, created: float, response):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        """ Removes expired entries and least recently used ones, until the size limit is kept """
+        if self._size <= self.max_size:
+            return
+        self._connection.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        self._size = self._connection.execute("SELECT TOTAL(LENGTH(value)) FROM responses").fetchone()[0]
+        rows = self._connection.execute("SELECT key, LENGTH(value) FROM responses ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= self.max_size:
+                break
+            evicted.append((key,))
+            self._size -= size
+            self._memory.pop(key, None)
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        """ Removes all cached responses """
+        with self._lock, self._db():
+            self._connection.execute("DELETE FROM responses")
+            self._memory.clear()
+            self._size = 0
+
+    def stats(self) -> CacheStats:
+        """ Returns numbers of hits and misses, number of cached responses and their total size in bytes """
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return CacheStats(self.hits, self.misses, entries, int(self._size))
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    cache = ResponseCache(":memory:", max_size=2000)
+    for i in range(100):
+        cache.put("search/item", {'nix_item_id': i}, {'foods': [{'food_name': f"food {i}", 'nf_calories': i}]})
+    print(cache.get("search/item", {'nix_item_id': 99}))
+    print(cache.get("search/item", {'nix_item_id': 0}))
+    start = time.perf_counter()
+    for _ in range(10000):
+        cache.get("search/item", {'nix_item_id': 99})
+    print(f"hit time: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us")
+    print(cache.stats())
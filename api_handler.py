@@ -1,5 +1,15 @@
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 import requests
 import json
+import random
+import threading
+import time
+
+from api_cache import ResponseCache
+from local_food_db import LocalFoodDatabase
 
 
 def get_headers(filename: str):
@@ -10,23 +20,86 @@ def get_headers(filename: str):
 
 headers_filename = "headers.json"
 base_url = "https://trackapi.nutritionix.com/v2/"
-headers = get_headers(headers_filename)
-headers["Content-Type"] = "application/json"
+search_results_limit = 20       # Maximal number of branded products returned by search_food
+_headers: dict | None = None     # Read from headers_filename before sending the first request
+response_cache = ResponseCache("api_cache.sqlite3")
+local_database = LocalFoodDatabase("foods.sqlite3")     # Products found there are not requested from the api
+
+# Connection settings
+connect_timeout = 3.05          # Seconds for establishing a connection
+read_timeout = 10               # Seconds of waiting for the server to send data
+max_retries = 3                 # Number of retries of the request, which failed with one of retry_statuses
+retry_statuses = {429, 500, 502, 503, 504}
+backoff_factor = 0.5            # Base of the delay between retries in seconds, doubled with each retry
+max_backoff = 30                # Maximal delay between retries in seconds
+_session: requests.Session | None = None
+_in_flight: dict[str, Future] = {}      # Requests being sent at the moment, by their cache key
+_in_flight_lock = threading.Lock()
+prefetch_workers = 4            # Maximal number of concurrent prefetch requests
+_prefetch_executor: ThreadPoolExecutor | None = None
+
+
+def get_api_headers() -> dict:
+    """ Returns headers of the api requests, the file with them is read on the first call """
+    global _headers
+    if _headers is None:
+        headers = get_headers(headers_filename)
+        headers["Content-Type"] = "application/json"
+        _headers = headers
+    return _headers
+
+
+def get_session() -> requests.Session:
+    """ Returns the session shared by all requests, so the connections to the api are reused """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def _retry_delay(retry: int, retry_after: str | None) -> float:
+    """
+    Returns time to wait before the next retry
+
+    :param retry: Number of retries already done
+    :param retry_after: Value of the Retry-After header of the response (seconds or http date), if it was given
+    :return: Delay from Retry-After header if given, otherwise exponential backoff with jitter
+    """
+    if retry_after:
+        try:
+            return min(max_backoff, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(max_backoff, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(max_backoff, backoff_factor * 2 ** retry))
+
+
+# Found products and a flag indicating if they come from the api (False if from the local database)
+SearchResults = namedtuple("SearchResults", ['products', 'remote'])
 
 
-def search_food(query: str) -> dict:
+def search_food(query: str) -> SearchResults:
     """
     Finds a product based on string query
 
     :param query: Name of the product
-    :return: Dict with the results
+    :return: Found products, from the local database if it has any
     """
+    local_results = local_database.search_food(query, search_results_limit)
+    if local_results:
+        return SearchResults(local_results, False)
     params = {
         'query': query,
         'branded': True,
         'common': False
     }
-    return _get_response(base_url + "search/instant", params)['branded']
+    response = _get_response(base_url + "search/instant", params)
+    return SearchResults(response['branded'] if response else [], True)
 
 
 def get_nutrition_by_id(item_id: str) -> dict:
@@ -36,11 +109,50 @@ def get_nutrition_by_id(item_id: str) -> dict:
     :param item_id: Unique product identifier (nix_item_id)
     :return: Dict with nutrition info
     """
+    local_info = local_database.get_nutrition_by_id(item_id)
+    if local_info:
+        return local_info
     params = {'nix_item_id': item_id}
     response = _get_response(base_url + "search/item", params)
     return response['foods'][0] if response else None
 
 
+def get_cached_nutrition_by_id(item_id: str) -> dict | None:
+    """
+    Returns information about nutrition of specific item only if it is cached, does not send any request
+
+    :param item_id: Unique product identifier (nix_item_id)
+    :return: Dict with nutrition info, None if it is not cached
+    """
+    local_info = local_database.get_nutrition_by_id(item_id)
+    if local_info:
+        return local_info
+    response = response_cache.get(base_url + "search/item", {'nix_item_id': item_id})
+    return response['foods'][0] if response else None
+
+
+def prefetch_nutrition(item_ids: list[str]) -> threading.Event:
+    """
+    Downloads information about nutrition of given items in the background, so it is cached when needed.
+    At most prefetch_workers requests are sent at the same time
+
+    :param item_ids: Unique product identifiers (nix_item_id), in order of downloading
+    :return: Event, setting it cancels downloading of items which have not been started yet
+    """
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="prefetch")
+    cancelled = threading.Event()
+    for item_id in item_ids:
+        _prefetch_executor.submit(_prefetch_item, item_id, cancelled)
+    return cancelled
+
+
+def _prefetch_item(item_id: str, cancelled: threading.Event):
+    if not cancelled.is_set():
+        get_nutrition_by_id(item_id)
+
+
 def get_nutrition_by_upc(upc: str) -> dict:
     """
     Downloads information about nutrition of specific item
@@ -48,6 +160,9 @@ def get_nutrition_by_upc(upc: str) -> dict:
     :param upc: Upc number of the product
     :return: Dict with nutrition info
     """
+    local_info = local_database.get_nutrition_by_upc(upc)
+    if local_info:
+        return local_info
     params = {'upc': upc}
     response = _get_response(base_url + "search/item", params)
     return response['foods'][0] if response else None
@@ -55,24 +170,52 @@ def get_nutrition_by_upc(upc: str) -> dict:
 
 def _get_response(url: str, params: dict):
     """
-    Sends request to given url with given parameters
+    Sends request to given url with given parameters. If the same request is already being sent by another thread,
+    waits for its response instead of sending it again
 
     :param url: Url address for request
     :param params: Dict with parameters of the request
     :return: Dict with response
     """
+    cached_response = response_cache.get(url, params)
+    if cached_response is not None:
+        return cached_response
+    key = ResponseCache.key(url, params)
+    with _in_flight_lock:
+        in_flight = _in_flight.get(key)
+        if in_flight is None:
+            _in_flight[key] = Future()
+    if in_flight is not None:
+        return in_flight.result()
+    response = None
+    try:
+        response = _download_response(url, params)
+        return response
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key).set_result(response)
+
+
+def _download_response(url: str, params: dict):
+    """ Sends request to given url with given parameters, saves the response in the cache """
     try:
-        response = requests.get(url, headers=headers, params=params)
+        for retry in range(max_retries + 1):
+            response = get_session().get(url, headers=get_api_headers(), params=params,
+                                         timeout=(connect_timeout, read_timeout))
+            if response.status_code not in retry_statuses or retry == max_retries:
+                break
+            time.sleep(_retry_delay(retry, response.headers.get("Retry-After")))
         response.raise_for_status()
+        response_cache.put(url, params, response.json())
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, OSError) as e:     # OSError if headers file can not be read
         print(f"Error: {e}")
         return None
 
 
 if __name__ == "__main__":
     """ testing functionalities """
-    search_result = search_food("apple")
+    search_result = search_food("apple").products
 
     if search_result:
         print(len(search_result))
@@ -0,0 +1,84 @@
+import hashlib
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+# .ui files compiled into python modules, paths are relative to the directory of this file
+UI_MODULES = {"main_window.ui": "ui_main_window.py"}
+
+
+def _path(filename: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+
+def _ui_hash(ui_filename: str) -> str:
+    with open(_path(ui_filename), 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def compiled_module(ui_filename: str):
+    """ Returns the module compiled from the .ui file, None if it does not exist or the .ui file changed since """
+    try:
+        module = importlib.import_module(os.path.splitext(UI_MODULES[ui_filename])[0])
+    except ImportError:
+        return None
+    return module if getattr(module, "UI_HASH", None) == _ui_hash(ui_filename) else None
+
+
+def _is_up_to_date(ui_filename: str) -> bool:
+    """ Checks if the module compiled from the .ui file exists and was compiled from its current version """
+    try:
+        with open(_path(UI_MODULES[ui_filename]), 'r', encoding='utf-8') as file:
+            return f"UI_HASH = \"{_ui_hash(ui_filename)}\"" in file.read()
+    except FileNotFoundError:
+        return False
+
+
+def compile_ui():
+    """ Compiles all the .ui files with pyside6-uic, compiled modules remember hash of the .ui file """
+    uic = shutil.which("pyside6-uic")
+    if uic is None:
+        raise FileNotFoundError("pyside6-uic not found, it is installed together with PySide6")
+    for ui_filename, module_filename in UI_MODULES.items():
+        subprocess.run([uic, _path(ui_filename), "-o", _path(module_filename)], check=True)
+        with open(_path(module_filename), 'a') as file:
+            file.write(f"\nUI_HASH = \"{_ui_hash(ui_filename)}\"\n")
+        print(f"{ui_filename} -> {module_filename}")
+
+
+def _window_construction_time(compiled: bool, runs: int) -> float:
+    """ Returns median time in milliseconds of constructing the main window with the compiled or loaded ui """
+    import gc
+    from PySide6.QtCore import QCoreApplication, QEvent
+    import GUI_main_window
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        window = GUI_main_window.MyMainWindow(compiled_ui=compiled, preload_users=False)
+        times.append((time.perf_counter() - start) * 1000)
+        # Only one window at a time can have the user opened, so the window is deleted at once
+        window.close()
+        window.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        del window
+        gc.collect()
+    return sorted(times)[len(times) // 2]
+
+
+if __name__ == '__main__':
+    """ compiling .ui files: python build_ui.py [--benchmark] """
+    # Benchmark measures the compiled modules as they are, they are compiled only if they are outdated
+    if "--benchmark" not in sys.argv or not all(_is_up_to_date(ui_filename) for ui_filename in UI_MODULES):
+        compile_ui()
+    if "--benchmark" in sys.argv:
+        import tempfile
+        from PySide6.QtWidgets import QApplication
+        import user
+        user.data_directory = tempfile.mkdtemp()     # Users of the measured windows are not saved with the real ones
+        app = QApplication(sys.argv)
+        for compiled in (False, True):
+            print(f"{'compiled ui' if compiled else 'QUiLoader'}: {_window_construction_time(compiled, 20):.1f} ms "
+                  f"per main window")
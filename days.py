@@ -0,0 +1,30 @@
+import datetime
+
+# Days are Julian day numbers, the same numbers as QDate.toJulianDay() returns, so the GUI converts them with
+# QDate.fromJulianDay() and QDate.toJulianDay()
+Day = int
+
+_ORDINAL_OFFSET = 1721425           # Julian day number of the day before 0001-01-01 (datetime ordinal 0)
+LAST_DAY: Day = datetime.date.max.toordinal() + _ORDINAL_OFFSET
+
+
+def today() -> Day:
+    return datetime.date.today().toordinal() + _ORDINAL_OFFSET
+
+
+def from_date(date: datetime.date) -> Day:
+    return date.toordinal() + _ORDINAL_OFFSET
+
+
+def from_ymd(year: int, month: int, day: int) -> Day:
+    """ Returns day of given date, used also for loading days pickled as QDate objects """
+    return from_date(datetime.date(year, month, day))
+
+
+def to_date(day: Day) -> datetime.date:
+    return datetime.date.fromordinal(day - _ORDINAL_OFFSET)
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    print(today(), to_date(today()), from_ymd(2024, 3, 5), to_date(LAST_DAY))
@@ -0,0 +1,153 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+from products import Nutrients
+
+_NUTRIENT_COLUMNS = ", ".join(Nutrients._fields)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    nix_item_id TEXT NOT NULL UNIQUE,
+    upc TEXT,
+    food_name TEXT NOT NULL,
+    brand_name TEXT,
+    {", ".join(f"{field} REAL" for field in Nutrients._fields)}
+);
+CREATE INDEX IF NOT EXISTS foods_upc ON foods(upc);
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(food_name, brand_name, content='foods', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS foods_insert AFTER INSERT ON foods BEGIN
+    INSERT INTO foods_fts(rowid, food_name, brand_name) VALUES (new.id, new.food_name, new.brand_name);
+END;
+CREATE TRIGGER IF NOT EXISTS foods_delete AFTER DELETE ON foods BEGIN
+    INSERT INTO foods_fts(foods_fts, rowid, food_name, brand_name)
+    VALUES ('delete', old.id, old.food_name, old.brand_name);
+END;
+CREATE TRIGGER IF NOT EXISTS foods_update AFTER UPDATE ON foods BEGIN
+    INSERT INTO foods_fts(foods_fts, rowid, food_name, brand_name)
+    VALUES ('delete', old.id, old.food_name, old.brand_name);
+    INSERT INTO foods_fts(rowid, food_name, brand_name) VALUES (new.id, new.food_name, new.brand_name);
+END;
+"""
+
+
+def _number(value) -> float | None:
+    """ Converts value from the dump to a number, empty values are None """
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+class LocalFoodDatabase:
+    """
+    Local catalog of products stored in an SQLite database with a full-text index of product and brand names.
+    Provides the same functions as api_handler and returns dicts with the same keys.
+    """
+    def __init__(self, filename: str):
+        """
+        :param filename: Name of the database file. It is not created until some products are imported
+        """
+        self.filename = filename
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _db(self, create: bool = False) -> sqlite3.Connection | None:
+        """ Returns connection to the database, None if the database does not exist and should not be created """
+        if self._connection is None and (create or os.path.exists(self.filename)):
+            self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def import_products(self, products: list[dict]) -> int:
+        """
+        Adds products to the database, products with already existing nix_item_id are replaced
+
+        :param products: Dicts with 'food_name' and optionally 'nix_item_id', 'upc', 'brand_name' and nutrients keys
+        :return: Number of imported products
+        """
+        with self._lock, self._db(create=True):
+            next_id = self._connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM foods").fetchone()[0]
+            rows = []
+            for idx, product in enumerate(products):
+                item_id = product.get("nix_item_id") or f"local-{next_id + idx}"
+                rows.append((item_id, product.get("upc") or None, product["food_name"],
+                             product.get("brand_name") or None,
+                             *(_number(product.get(field)) for field in Nutrients._fields)))
+            updated_columns = ["upc", "food_name", "brand_name", *Nutrients._fields]
+            self._connection.executemany(
+                f"INSERT INTO foods (nix_item_id, upc, food_name, brand_name, {_NUTRIENT_COLUMNS}) "
+                f"VALUES ({', '.join('?' * (len(Nutrients._fields) + 4))}) ON CONFLICT(nix_item_id) DO UPDATE SET "
+                f"{', '.join(f'{column} = excluded.{column}' for column in updated_columns)}", rows)
+        return len(rows)
+
+    def import_file(self, filename: str) -> int:
+        """
+        Imports products from a CSV file with a header row, or a JSON file with a list of products
+        (or a dict with such a list under 'foods' key, as in api responses)
+
+        :return: Number of imported products
+        """
+        if filename.lower().endswith(".json"):
+            with open(filename, 'r', encoding='utf-8') as file:
+                products = json.load(file)
+            if isinstance(products, dict):
+                products = products["foods"]
+        else:
+            with open(filename, 'r', encoding='utf-8', newline='') as file:
+                products = list(csv.DictReader(file))
+        return self.import_products(products)
+
+    def search_food(self, query: str, limit: int = 20) -> list[dict]:
+        """
+        Finds products, which names or brands contain words beginning with all the words of the query
+
+        :param query: Name of the product
+        :param limit: Maximal number of returned products
+        :return: List of dicts with 'food_name', 'brand_name' and 'nix_item_id' keys, best matches first
+        """
+        words = re.findall(r"\w+", query)
+        with self._lock:
+            if not words or self._db() is None:
+                return []
+            match = " AND ".join(f'"{word}"*' for word in words)
+            rows = self._connection.execute(
+                "SELECT f.food_name, f.brand_name, f.nix_item_id FROM foods_fts JOIN foods f ON f.id = foods_fts.rowid "
+                "WHERE foods_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)).fetchall()
+            return [dict(row) for row in rows]
+
+    def get_nutrition_by_id(self, item_id: str) -> dict | None:
+        """
+        :param item_id: Unique product identifier (nix_item_id)
+        :return: Dict with nutrition info, None if the product is not in the database
+        """
+        return self._get_nutrition("nix_item_id", item_id)
+
+    def get_nutrition_by_upc(self, upc: str) -> dict | None:
+        """
+        :param upc: Upc number of the product
+        :return: Dict with nutrition info, None if the product is not in the database
+        """
+        return self._get_nutrition("upc", str(upc))
+
+    def _get_nutrition(self, column: str, value: str) -> dict | None:
+        with self._lock:
+            if self._db() is None:
+                return None
+            row = self._connection.execute(
+                f"SELECT food_name, brand_name, nix_item_id, upc, {_NUTRIENT_COLUMNS} FROM foods WHERE {column} = ?",
+                (value,)).fetchone()
+            return dict(row) if row else None
+
+
+if __name__ == '__main__':
+    """ importing products: python local_food_db.py <dump.csv|dump.json> """
+    database = LocalFoodDatabase("foods.sqlite3")
+    for dump_filename in sys.argv[1:]:
+        print(f"{dump_filename}: imported {database.import_file(dump_filename)} products")
+    print(database.search_food("apple"))
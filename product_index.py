@@ -0,0 +1,106 @@
+from collections import Counter
+import unicodedata
+import re
+
+from products import ProductType
+
+
+def _normalized_words(text: str) -> list[str]:
+    """ Splits text into lowercase words without diacritics """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char)).replace("ł", "l")
+    return re.findall(r"\w+", text)
+
+
+def _trigrams(text: str, prefix: bool = False) -> set[str]:
+    """
+    Returns trigrams of all the words of the text, words are padded with two spaces in front and one at the end
+
+    :param prefix: If True, the last word is treated as a beginning of a word (no trigrams with its end)
+    """
+    words = _normalized_words(text)
+    trigrams = set()
+    for idx, word in enumerate(words):
+        padded = "  " + word if prefix and idx == len(words) - 1 else "  " + word + " "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+class ProductIndex:
+    """
+    In-memory trigram index of product type names with typo tolerant, ranked matching.
+    Product types with the same name and nutrients are indexed once
+    """
+    def __init__(self, product_types: list[ProductType] = (), min_similarity: float = 0.4):
+        """
+        :param product_types: Product types initially added to the index
+        :param min_similarity: Minimal fraction of query trigrams, which have to be found in the name of a product
+        """
+        self.min_similarity = min_similarity
+        self._product_types: list[ProductType] = []
+        self._trigram_counts: list[int] = []                # Number of trigrams of each indexed name
+        self._postings: dict[str, list[int]] = {}           # trigram -> indices of product types having it
+        self._keys: set[tuple] = set()
+        for product_type in product_types:
+            self.add(product_type)
+
+    def __len__(self):
+        return len(self._product_types)
+
+    def add(self, product_type: ProductType):
+        """ Adds product type to the index, if a product type with the same name and nutrients is not indexed yet """
+        key = (product_type.name, product_type.nutrients)
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        idx = len(self._product_types)
+        trigrams = _trigrams(product_type.name)
+        self._product_types.append(product_type)
+        self._trigram_counts.append(len(trigrams))
+        for trigram in trigrams:
+            self._postings.setdefault(trigram, []).append(idx)
+
+    def search(self, query: str, limit: int = 20) -> list[ProductType]:
+        """
+        Finds product types with names similar to the query. The last word of the query may be unfinished
+
+        :param query: Name of the product, possibly with typos
+        :param limit: Maximal number of returned product types
+        :return: Product types ordered from the best match, names covering more of the query and shorter names first
+        """
+        query_trigrams = _trigrams(query, prefix=True)
+        if not query_trigrams:
+            return []
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+        min_shared = self.min_similarity * len(query_trigrams)
+        scores = []
+        for idx, count in shared.items():
+            if count >= min_shared:
+                dice = 2 * count / (len(query_trigrams) + self._trigram_counts[idx])
+                scores.append((count, dice, -idx))
+        scores.sort(reverse=True)
+        return [self._product_types[-neg_idx] for _, _, neg_idx in scores[:limit]]
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    import random
+    import time
+
+    index = ProductIndex([ProductType("Chicken breast"), ProductType("Jabłko"), ProductType("Apple pie")])
+    print(index.search("chiken"), index.search("jablk"), index.search("aple"))
+
+    words = ["chicken", "beef", "apple", "banana", "bread", "cheese", "yoghurt", "rice", "pasta", "tomato", "soup",
+             "salad", "milk", "chocolate", "orange", "juice", "grilled", "baked", "fresh", "sweet", "spicy", "whole"]
+    random.seed(0)
+    for i in range(50000):
+        index.add(ProductType(" ".join(random.sample(words, 3)) + f" {i}"))
+    start = time.perf_counter()
+    queries = ["chiken", "chocolat mlk", "banan bred", "gril", "spicy tomatto soup"]
+    for _ in range(20):
+        for query in queries:
+            index.search(query)
+    latency = (time.perf_counter() - start) / (20 * len(queries)) * 1000
+    print(f"{len(index)} products, average search time: {latency:.2f} ms (target < 50 ms)")
@@ -1,4 +1,9 @@
-from collections import namedtuple
+from array import array
+from collections import OrderedDict, namedtuple
+import hashlib
+import math
+import threading
+import weakref
 
 Nutrients = namedtuple("Nutrients", ['nf_calories', 'nf_total_fat',
                                      'nf_saturated_fat', 'nf_cholesterol', 'nf_total_carbohydrate',
@@ -6,7 +11,12 @@ Nutrients = namedtuple("Nutrients", ['nf_calories', 'nf_total_fat',
 
 
 class ProductType:
-    """ Defines all characteristics of an eatable product """
+    """
+    Defines all characteristics of an eatable product. Combined products (recipes) keep also their ingredients and
+    flags of nutrients, which were not known for every ingredient
+    """
+    __slots__ = ('name', 'description', 'nutrients', 'partial_nutrients', 'ingredients', '__weakref__')
+
     def __init__(self, name: str, **nutrients):
         """
         :param name: Name of the product
@@ -15,27 +25,127 @@ class ProductType:
         """
         self.name = name
         self.description = None
-        self.nutrients: Nutrients = Nutrients(**({field: nutrients.get(field, None) for field in Nutrients._fields}))
+        self.nutrients: Nutrients = Nutrients._make(nutrients.get(field) for field in Nutrients._fields)
+        self.partial_nutrients: tuple[bool, ...] = ()       # Empty if every nutrient value is complete
+        self.ingredients: tuple[Product, ...] = ()          # Empty if the product is not combined
 
     def __repr__(self):
         return self.name
 
+    def __getstate__(self):
+        return {'name': self.name, 'description': self.description, 'nutrients': self.nutrients,
+                'partial_nutrients': self.partial_nutrients, 'ingredients': self.ingredients}
+
+    def __setstate__(self, state: dict):
+        # State is a dict also in pickles made before slots were introduced, it may lack newer attributes
+        self.partial_nutrients = ()
+        self.ingredients = ()
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+
+    def content_id(self) -> str:
+        """ Returns identifier computed from the content of the product type, equal for product types alike """
+        # Numbers are compared as floats, databases may return 100.0 for 100
+        nutrients = tuple(None if value is None else float(value) for value in self.nutrients)
+        content = (self.name, self.description, nutrients)
+        if self.ingredients:
+            content += (self.partial_nutrients, _ingredients_key(self.ingredients))
+        return hashlib.blake2b(repr(content).encode(), digest_size=8).hexdigest()
+
     @staticmethod
     def combine_products(name: str, ingreedients: list['Product']) -> 'ProductType':
-        """ Takes list of actual products as ingreedients and creates a new ProductType out of it """
-        combined_nutrients = {}
-        combined_weight = sum([product.weight for product in ingreedients])
-        for idx, nut_name in enumerate(Nutrients._fields):
-            for product in ingreedients:
-                if product.product_type.nutrients[idx]:
-                    combined_nutrients[nut_name] = (combined_nutrients.get(nut_name, 0) +
-                                                    product.product_type.nutrients[idx] * product.weight/100)
-            combined_nutrients[nut_name] = combined_nutrients.get(nut_name, 0) * 100/combined_weight
-        return ProductType(name, **combined_nutrients)
+        """
+        Takes list of actual products as ingreedients and creates a new ProductType out of it.
+        Ingreedients can be combined products too
+        """
+        combined = ProductType(name)
+        combined.ingredients = tuple(ingreedients)
+        combined.nutrients, combined.partial_nutrients = combine_nutrients(combined.ingredients)
+        return combined
+
+
+combination_cache_size = 1024       # Number of ingredients lists, which combined nutrients are remembered
+_combinations: OrderedDict[tuple, tuple[Nutrients, tuple[bool, ...]]] = OrderedDict()
+_combinations_lock = threading.Lock()
+
+
+def _ingredients_key(ingredients: tuple['Product', ...]) -> tuple:
+    return tuple((product.product_type.content_id(), float(product.weight)) for product in ingredients)
+
+
+def combine_nutrients(ingredients: tuple['Product', ...]) -> tuple[Nutrients, tuple[bool, ...]]:
+    """
+    Counts nutrients in 100g of a mixture of ingredients. Results are memoized by the nutrients and weights of
+    the ingredients, so recombining a recipe, which ingredients did not change, costs only a lookup
+
+    :return: tuple in a form (nutrients, partial) where:
+        nutrients - nutrients of the mixture, None if no ingredient has given nutrient known or the mixture weighs 0
+        partial - for every nutrient, bool value indicating if it is known only for some of the ingredients,
+                  empty tuple if every nutrient is known for all the ingredients
+    """
+    # Result depends only on these values, nested combined products are represented by their combined nutrients
+    key = tuple((product.product_type.nutrients, product.product_type.partial_nutrients, product.weight)
+                for product in ingredients)
+    with _combinations_lock:
+        if key in _combinations:
+            _combinations.move_to_end(key)
+            return _combinations[key]
+    combination = _combined_nutrients(ingredients)
+    with _combinations_lock:
+        _combinations[key] = combination
+        while len(_combinations) > combination_cache_size:
+            _combinations.popitem(last=False)
+    return combination
+
+
+def _combined_nutrients(ingredients: tuple['Product', ...]) -> tuple[Nutrients, tuple[bool, ...]]:
+    """ Counts all the nutrients of the mixture in one pass over the nutrients matrix of the ingredients """
+    import numpy as np      # Loaded on the first use, it is not needed for starting the app
+    weights = np.array([product.weight for product in ingredients], dtype=np.float64)
+    total_weight = weights.sum()
+    if len(ingredients) == 0 or total_weight <= 0:
+        return Nutrients(*(None for _ in Nutrients._fields)), ()
+    matrix = np.fromiter((math.nan if value is None else value
+                          for product in ingredients for value in product.product_type.nutrients),
+                         dtype=np.float64, count=len(ingredients) * len(Nutrients._fields))
+    matrix = matrix.reshape(len(ingredients), len(Nutrients._fields))
+    unknown = np.isnan(matrix)
+    known_any = ~unknown.all(axis=0)
+    partial = unknown.any(axis=0)
+    for product in ingredients:
+        if product.product_type.partial_nutrients:
+            partial |= np.array(product.product_type.partial_nutrients)
+    partial &= known_any
+    amounts = np.nan_to_num(matrix).T @ weights / total_weight
+    nutrients = Nutrients._make(float(amount) if known else None for amount, known in zip(amounts, known_any))
+    return nutrients, tuple(partial.tolist()) if partial.any() else ()
+
+
+# Interned product types by their content ids. Product types are removed when no product uses them anymore
+_registry: weakref.WeakValueDictionary[str, ProductType] = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
+
+
+def intern_product_type(product_type: ProductType) -> ProductType:
+    """
+    Returns the registered product type with the same content as given one, registers given one if there is none.
+    Interned product types are shared by many products, so they must not be modified
+
+    :param product_type: Product type, that will not be modified anymore
+    :return: Product type, that should be used instead of given one
+    """
+    content_id = product_type.content_id()
+    with _registry_lock:
+        interned = _registry.get(content_id)
+        if interned is None:
+            _registry[content_id] = interned = product_type
+        return interned
 
 
 class Product:
     """ Represents an actual product """
+    __slots__ = ('product_type', 'weight')
+
     def __init__(self, product_type: ProductType, weight: float):
         """
         :param product_type: Type of the product characterized by ProductType class
@@ -47,8 +157,149 @@ class Product:
     def __repr__(self):
         return f"{self.weight}g\t{self.product_type.name}"
 
+    def __getstate__(self):
+        return {'product_type': self.product_type, 'weight': self.weight}
+
+    def __setstate__(self, state: dict):
+        self.product_type = state['product_type']
+        self.weight = state['weight']
+
+
+class ProductsArray:
+    """
+    Compact container of products (e.g. eaten at one day or during a range of days). Each product takes only its
+    weight and the index of its type in two arrays. Nutrients per 100g of distinct product types are kept in
+    a contiguous row-major matrix, unknown values are NaN
+    """
+    __slots__ = ('product_types', 'type_indices', 'weights', 'type_nutrients', '_type_index')
+
+    def __init__(self, products: list[Product] = ()):
+        """
+        :param products: Products initially added to the container
+        """
+        self.product_types: list[ProductType] = []      # Distinct product types
+        self.type_indices = array('I')
+        self.weights = array('d')
+        self.type_nutrients = array('d')
+        self._type_index: dict[ProductType, int] = {}
+        for product in products:
+            self.append(product)
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __getitem__(self, idx: int) -> Product:
+        return Product(self.product_types[self.type_indices[idx]], self.weights[idx])
+
+    def __iter__(self):
+        return (Product(self.product_types[type_idx], weight) for type_idx, weight in zip(self.type_indices,
+                                                                                        self.weights))
+
+    def append(self, product: Product):
+        type_idx = self._type_index.get(product.product_type)
+        if type_idx is None:
+            type_idx = self._type_index[product.product_type] = len(self.product_types)
+            self.product_types.append(product.product_type)
+            self.type_nutrients.extend(math.nan if value is None else value
+                                       for value in product.product_type.nutrients)
+        self.type_indices.append(type_idx)
+        self.weights.append(product.weight)
+
+    def nutrients_matrix(self) -> 'np.ndarray':
+        """ Returns nutrients per 100g with a row for each product """
+        import numpy as np
+        type_matrix = np.frombuffer(self.type_nutrients, dtype=np.float64).reshape(-1, len(Nutrients._fields))
+        return type_matrix[np.frombuffer(self.type_indices, dtype=np.uint32)]
+
+    def totals(self) -> 'NutrientsTotals':
+        """ Sums nutrients of all the products """
+        import numpy as np
+        totals = NutrientsTotals()
+        if len(self) == 0:
+            return totals
+        matrix = self.nutrients_matrix()
+        totals.products_count = len(self)
+        totals.amounts = (np.nan_to_num(matrix).T @ np.frombuffer(self.weights, dtype=np.float64) / 100).tolist()
+        totals.unknown_counts = np.isnan(matrix).sum(axis=0).tolist()
+        return totals
+
+
+class NutrientsTotals:
+    """ Sums of nutrients of a group of products (e.g. eaten at one day), updated incrementally """
+    def __init__(self, products: list[Product] = ()):
+        """
+        :param products: Products initially included in the sums
+        """
+        self.products_count = 0
+        self.amounts = [0.0] * len(Nutrients._fields)
+        self.unknown_counts = [0] * len(Nutrients._fields)     # Numbers of products with unknown value of a nutrient
+        for product in products:
+            self.add(product)
+
+    def add(self, product: Product):
+        self._update(product, 1)
+
+    def remove(self, product: Product):
+        self._update(product, -1)
+        if self.products_count == 0:
+            # Clears rounding errors accumulated by subtracting
+            self.amounts = [0.0] * len(Nutrients._fields)
+
+    def _update(self, product: Product, sign: int):
+        self.products_count += sign
+        for idx, value in enumerate(product.product_type.nutrients):
+            if value is None:
+                self.unknown_counts[idx] += sign
+            else:
+                self.amounts[idx] += sign * value * product.weight / 100
+
+    def nutrient(self, nutrient_idx: int) -> tuple[float, bool]:
+        """
+        :param nutrient_idx: Index of the nutrient
+        :return: tuple in a form (amount, correct) where:
+            amount - amount of selected nutrient in all the products
+            correct - bool value indicating if none of the nutrient values were NoneType
+        """
+        return self.amounts[nutrient_idx], self.unknown_counts[nutrient_idx] == 0
+
 
 if __name__ == '__main__':
     """ testing functionalities """
+    import tracemalloc
+
     p = ProductType("ziarno", nf_calories=3, other=0)
     print(p)
+
+    class DictProductType:
+        """ Layout of ProductType before slots """
+        def __init__(self, name: str, **nutrients):
+            self.name = name
+            self.description = None
+            self.nutrients = Nutrients(**({field: nutrients.get(field, None) for field in Nutrients._fields}))
+
+    class DictProduct:
+        """ Layout of Product before slots """
+        def __init__(self, product_type, weight: float):
+            self.product_type = product_type
+            self.weight = weight
+
+    def measure(create) -> int:
+        tracemalloc.start()
+        created = create()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del created
+        return size
+
+    count = 200000
+    values = {field: float(idx) for idx, field in enumerate(Nutrients._fields)}
+    layouts = {
+        "dict-backed objects, type per product": lambda: [DictProduct(DictProductType("p", **values), i)
+                                                         for i in range(count)],
+        "slotted objects, type per product": lambda: [Product(ProductType("p", **values), i) for i in range(count)],
+        "slotted objects, shared types": lambda: [Product(shared_type, i) for i in range(count)],
+        "ProductsArray, shared types": lambda: ProductsArray(Product(shared_type, i) for i in range(count)),
+    }
+    shared_type = ProductType("p", **values)
+    for description, create in layouts.items():
+        print(f"{description}: {measure(create) / count:.1f} bytes per product")
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+from products import ProductType, intern_product_type
+
+
+class RecentProducts:
+    """
+    Bounded cache of recently used product types. Product types are identified by their content ids, so using the same
+    product type again only moves it to the front and counts the use.
+    When the cache is full, the least used one of the oldest entries is evicted, so products used often stay in the
+    cache even if they were not used recently, while products used once leave it after a while
+    """
+    def __init__(self, capacity: int = 50, entries: list[tuple[ProductType, int]] = ()):
+        """
+        :param capacity: Maximal number of product types in the cache
+        :param entries: Initial (product type, number of uses) pairs, from the least to the most recently used
+        """
+        self.capacity = capacity
+        self._entries: OrderedDict[str, list] = OrderedDict()     # content id -> [product type, number of uses]
+        for product_type, uses in entries:
+            self._entries[product_type.content_id()] = [intern_product_type(product_type), uses]
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, product_type: ProductType) -> bool:
+        return product_type.content_id() in self._entries
+
+    def __getstate__(self):
+        return {"capacity": self.capacity, "entries": self.entries()}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["capacity"], state["entries"])
+
+    def get(self, content_id: str) -> ProductType | None:
+        """ Returns the product type with given content id, None if it is not in the cache """
+        entry = self._entries.get(content_id)
+        return entry[0] if entry else None
+
+    def use(self, product_type: ProductType) -> ProductType:
+        """ Marks product type as the most recently used one, returns the product type kept in the cache """
+        content_id = product_type.content_id()
+        entry = self._entries.get(content_id)
+        if entry is None:
+            entry = self._entries[content_id] = [intern_product_type(product_type), 0]
+        else:
+            self._entries.move_to_end(content_id)
+        entry[1] += 1
+        self._evict()
+        return entry[0]
+
+    def _evict(self):
+        """ Removes entries over the capacity, the least used one of the oldest quarter of the cache goes first """
+        while len(self._entries) > self.capacity:
+            window = max(1, self.capacity // 4)
+            oldest = [content_id for content_id, _ in zip(self._entries, range(window))]
+            del self._entries[min(oldest, key=lambda content_id: self._entries[content_id][1])]
+
+    def uses(self, product_type: ProductType) -> int:
+        """ Returns how many times the product type was used while it was in the cache """
+        entry = self._entries.get(product_type.content_id())
+        return entry[1] if entry else 0
+
+    def entries(self) -> list[tuple[ProductType, int]]:
+        """ Returns (product type, number of uses) pairs, from the least to the most recently used """
+        return [(product_type, uses) for product_type, uses in self._entries.values()]
+
+    def most_recent(self) -> list[ProductType]:
+        """ Returns product types from the most recently used """
+        return [product_type for product_type, _ in reversed(self._entries.values())]
+
+    def most_used(self) -> list[ProductType]:
+        """ Returns product types from the most often used, equally often used ones from the most recently used """
+        entries = sorted(reversed(self._entries.values()), key=lambda entry: -entry[1])
+        return [product_type for product_type, _ in entries]
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    import time
+
+    recent = RecentProducts(capacity=4)
+    bread, milk = ProductType("bread", nf_calories=250), ProductType("milk", nf_calories=64)
+    for product_type in [bread, milk, bread, ProductType("apple"), ProductType("bread", nf_calories=250)]:
+        recent.use(product_type)
+    print(recent.most_recent(), recent.most_used(), recent.uses(bread))
+    for name in ["pear", "plum", "kiwi"]:
+        recent.use(ProductType(name))
+    print(recent.most_recent(), bread in recent)
+
+    recent = RecentProducts(capacity=100)
+    product_types = [ProductType(f"product {i}", nf_calories=i) for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(100000):
+        recent.use(product_types[(i * i) % 1000])
+    print(f"{len(recent)} cached, {(time.perf_counter() - start) * 10:.2f} µs per use")
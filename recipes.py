@@ -0,0 +1,90 @@
+from products import ProductType, Product, intern_product_type
+
+
+class RecipeBook:
+    """
+    Dependency graph of combined products (recipes) and their ingredients. Product types are identified by their
+    content ids, so equal product types loaded separately are the same node of the graph.
+    When a product type changes, only recipes depending on it are combined again, in topological order
+    """
+    def __init__(self, product_types: list[ProductType] = ()):
+        """
+        :param product_types: Product types added to the book, recipes among them are tracked
+        """
+        self._dependents: dict[str, dict[str, ProductType]] = {}    # content id -> recipes using it directly
+        for product_type in product_types:
+            self.add(product_type)
+
+    def add(self, product_type: ProductType):
+        content_id = product_type.content_id()
+        for ingredient in product_type.ingredients:
+            self._dependents.setdefault(ingredient.product_type.content_id(), {})[content_id] = product_type
+
+    def remove(self, product_type: ProductType):
+        content_id = product_type.content_id()
+        for ingredient in product_type.ingredients:
+            dependents = self._dependents.get(ingredient.product_type.content_id(), {})
+            dependents.pop(content_id, None)
+
+    def dependents(self, product_type: ProductType) -> list[ProductType]:
+        """ Returns all recipes depending on the product type directly or indirectly, ingredients before recipes """
+        affected: dict[str, ProductType] = {}
+        stack = [product_type.content_id()]
+        while stack:
+            for content_id, recipe in self._dependents.get(stack.pop(), {}).items():
+                if content_id not in affected:
+                    affected[content_id] = recipe
+                    stack.append(content_id)
+        # Kahn's algorithm on the affected part of the graph
+        waiting = {content_id: len({ingredient.product_type.content_id() for ingredient in recipe.ingredients}
+                                   & affected.keys())
+                   for content_id, recipe in affected.items()}
+        ready = [content_id for content_id, count in waiting.items() if count == 0]
+        ordered = []
+        while ready:
+            content_id = ready.pop()
+            ordered.append(affected[content_id])
+            for dependent_id in self._dependents.get(content_id, {}):
+                waiting[dependent_id] -= 1
+                if waiting[dependent_id] == 0:
+                    ready.append(dependent_id)
+        return ordered
+
+    def recombined(self, old: ProductType, new: ProductType) -> dict[str, ProductType]:
+        """
+        Combines again recipes depending on the product type, as if it was replaced with the new one.
+        The book itself is not changed, replaced product types have to be removed and the new ones added
+
+        :return: New product types by the content ids of the ones they replace, including the replaced one
+        """
+        replaced = {old.content_id(): intern_product_type(new)}
+        for recipe in self.dependents(old):
+            ingredients = [Product(replaced.get(ingredient.product_type.content_id(), ingredient.product_type),
+                                   ingredient.weight) for ingredient in recipe.ingredients]
+            recombined = ProductType.combine_products(recipe.name, ingredients)
+            recombined.description = recipe.description
+            replaced[recipe.content_id()] = intern_product_type(recombined)
+        return replaced
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    import time
+
+    flour = ProductType("flour", nf_calories=350)
+    dough = ProductType.combine_products("dough", [Product(flour, 500), Product(ProductType("water"), 300)])
+    pizza = ProductType.combine_products("pizza", [Product(dough, 800), Product(ProductType("cheese",
+                                                                                            nf_calories=400), 200)])
+    book = RecipeBook([flour, dough, pizza])
+    print(book.dependents(flour))
+    replaced = book.recombined(flour, ProductType("flour", nf_calories=364))
+    print({product_type.name: product_type.nutrients.nf_calories for product_type in replaced.values()})
+
+    # Book of 5000 recipes of two ingredients each, changing an ingredient recombines only the two recipes using it
+    base = [ProductType(f"ingredient {i}", nf_calories=i) for i in range(5000)]
+    recipes = [ProductType.combine_products(f"recipe {i}", [Product(base[i], 100), Product(base[i - 1], 50)])
+               for i in range(5000)]
+    book = RecipeBook(base + recipes)
+    start = time.perf_counter()
+    replaced = book.recombined(base[10], ProductType("ingredient 10", nf_calories=1000))
+    print(f"{len(replaced) - 1} recipes recombined in {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,335 @@
+import sqlite3
+
+from products import ProductType, Product, Nutrients, NutrientsTotals, intern_product_type, combine_nutrients
+from storage import UserStorage
+from days import Day
+from recent_products import RecentProducts
+
+_NUTRIENT_COLUMNS = ", ".join(Nutrients._fields)
+_LIMIT_COLUMNS = ", ".join("limit_" + field for field in Nutrients._fields)
+_UNKNOWN_COLUMNS = ", ".join("unknown_" + field for field in Nutrients._fields)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    gender TEXT NOT NULL DEFAULT '',
+    age INTEGER NOT NULL DEFAULT 0,
+    height REAL NOT NULL DEFAULT 0,
+    weight REAL NOT NULL DEFAULT 0,
+    {", ".join(f"limit_{field} REAL" for field in Nutrients._fields)}
+);
+CREATE TABLE IF NOT EXISTS product_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    content_id TEXT,
+    {", ".join(f"{field} REAL" for field in Nutrients._fields)}
+);
+CREATE TABLE IF NOT EXISTS product_ingredients (
+    product_type_id INTEGER NOT NULL REFERENCES product_types(id),
+    position INTEGER NOT NULL,
+    ingredient_type_id INTEGER NOT NULL REFERENCES product_types(id),
+    weight REAL NOT NULL,
+    PRIMARY KEY (product_type_id, position)
+);
+CREATE TABLE IF NOT EXISTS custom_products (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    product_type_id INTEGER NOT NULL REFERENCES product_types(id)
+);
+CREATE TABLE IF NOT EXISTS eaten_products (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    day INTEGER NOT NULL,
+    product_type_id INTEGER NOT NULL REFERENCES product_types(id),
+    weight REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS eaten_products_user_day ON eaten_products(user_id, day);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    day INTEGER NOT NULL,
+    products_count INTEGER NOT NULL,
+    {", ".join(f"{field} REAL NOT NULL" for field in Nutrients._fields)},
+    {", ".join(f"unknown_{field} INTEGER NOT NULL" for field in Nutrients._fields)},
+    PRIMARY KEY (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS custom_products_user ON custom_products(user_id);
+CREATE TABLE IF NOT EXISTS recent_products (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    position INTEGER NOT NULL,
+    product_type_id INTEGER NOT NULL REFERENCES product_types(id),
+    uses INTEGER NOT NULL,
+    PRIMARY KEY (user_id, position)
+);
+"""
+# Created after content ids are filled in databases made before they were introduced
+_CONTENT_ID_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS product_types_content_id ON product_types(content_id)"
+# Columns referring to product types, rewritten when duplicate product types are merged
+_PRODUCT_TYPE_REFERENCES = [("product_ingredients", "ingredient_type_id"), ("custom_products", "product_type_id"),
+                            ("eaten_products", "product_type_id"), ("recent_products", "product_type_id")]
+
+
+def usernames(db_filename: str) -> list[str]:
+    """ Returns names of all users saved in the database """
+    with sqlite3.connect(db_filename) as connection:
+        connection.executescript(_SCHEMA)
+        return [row[0] for row in connection.execute("SELECT name FROM users ORDER BY id")]
+
+
+class SqliteStorage(UserStorage):
+    """
+    Storage keeping user data in an SQLite database shared by all users. Eat history is not loaded at once,
+    it is queried day by day (days are stored as julian day numbers, indexed together with the user).
+    Product types are stored once for all users, they are identified by their content ids.
+    """
+    lazy_history = True
+
+    def __init__(self, db_filename: str, username: str):
+        """
+        :param db_filename: Name of the database file
+        :param username: Name of the user, whose data is stored
+        """
+        super().__init__(db_filename)
+        self.username = username
+        self._connection = sqlite3.connect(db_filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._user_id: int | None = self._find_user_id()
+        # Product types already stored in the database, both directions keep the same objects
+        self._product_types: dict[int, ProductType] = {}
+        self._product_type_ids: dict[ProductType, int] = {}
+        with self.lock, self._connection:
+            self._add_content_ids()
+            self._connection.execute(_CONTENT_ID_INDEX)
+
+    def _add_content_ids(self):
+        """
+        Fills content ids of product types stored before they were introduced. Product types with the same content
+        are merged into the one stored first. Has to be called inside a transaction
+        """
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(product_types)")]
+        if "content_id" not in columns:
+            self._connection.execute("ALTER TABLE product_types ADD COLUMN content_id TEXT")
+        if not self._connection.execute("SELECT 1 FROM product_types WHERE content_id IS NULL").fetchone():
+            return
+        kept_ids: dict[str, int] = {}
+        for type_id, in self._connection.execute("SELECT id FROM product_types ORDER BY id").fetchall():
+            kept_id = kept_ids.setdefault(self._product_type(type_id).content_id(), type_id)
+            if kept_id != type_id:
+                for table, column in _PRODUCT_TYPE_REFERENCES:
+                    self._connection.execute(f"UPDATE {table} SET {column} = ? WHERE {column} = ?",
+                                             (kept_id, type_id))
+                self._connection.execute("DELETE FROM product_ingredients WHERE product_type_id = ?", (type_id,))
+                self._connection.execute("DELETE FROM product_types WHERE id = ?", (type_id,))
+        self._connection.executemany("UPDATE product_types SET content_id = ? WHERE id = ?",
+                                     list(kept_ids.items()))
+        self._product_types.clear()
+        self._product_type_ids.clear()
+
+    def has_data(self) -> bool:
+        return self._user_id is not None
+
+    def _find_user_id(self) -> int | None:
+        row = self._connection.execute("SELECT id FROM users WHERE name = ?", (self.username,)).fetchone()
+        return row[0] if row else None
+
+    def load(self) -> tuple[dict, list[tuple[str, tuple]]]:
+        with self.lock:
+            if self._user_id is None:
+                raise FileNotFoundError(f"User {self.username} not found in {self.filename}")
+            row = self._connection.execute(
+                f"SELECT gender, age, height, weight, {_LIMIT_COLUMNS} FROM users WHERE id = ?",
+                (self._user_id,)).fetchone()
+            type_ids = self._connection.execute(
+                "SELECT product_type_id FROM custom_products WHERE user_id = ? ORDER BY id", (self._user_id,))
+            if not self._connection.execute("SELECT 1 FROM daily_totals WHERE user_id = ?",
+                                            (self._user_id,)).fetchone():
+                # Database created before daily totals were introduced
+                with self._connection:
+                    self._update_daily_totals()
+            totals = self._connection.execute(
+                f"SELECT day, products_count, {_NUTRIENT_COLUMNS}, {_UNKNOWN_COLUMNS} FROM daily_totals "
+                f"WHERE user_id = ?", (self._user_id,))
+            data = {
+                "username": self.username,
+                "custom_products": [self._product_type(type_id) for type_id, in type_ids.fetchall()],
+                "eat_history": {},
+                "daily_totals": {row[0]: self._nutrients_totals(row) for row in totals},
+                "gender": row[0],
+                "age": row[1],
+                "height": row[2],
+                "weight": row[3],
+                "limits": Nutrients(*row[4:]),
+                "recent_products": self._recent_products()
+            }
+            return data, []
+
+    def load_eaten_days(self, first: Day, last: Day) -> dict[Day, list[Product]]:
+        with self.lock:
+            days = {}
+            rows = self._connection.execute(
+                "SELECT day, product_type_id, weight FROM eaten_products WHERE user_id = ? AND day BETWEEN ? AND ? "
+                "ORDER BY id", (self._user_id, first, last)).fetchall()
+            for day, type_id, weight in rows:
+                days.setdefault(day, []).append(Product(self._product_type(type_id), weight))
+            return days
+
+    def history_range(self) -> tuple[Day, Day] | None:
+        with self.lock:
+            first, last = self._connection.execute("SELECT MIN(day), MAX(day) FROM eaten_products WHERE user_id = ?",
+                                                   (self._user_id,)).fetchone()
+            return (first, last) if first is not None else None
+
+    @staticmethod
+    def _nutrients_totals(row: tuple) -> NutrientsTotals:
+        """ Creates NutrientsTotals from a daily_totals row starting with the products_count column """
+        totals = NutrientsTotals()
+        totals.products_count = row[1]
+        totals.amounts = list(row[2:2 + len(Nutrients._fields)])
+        totals.unknown_counts = list(row[2 + len(Nutrients._fields):])
+        return totals
+
+    def _update_daily_totals(self, date: Day = None):
+        """ Counts again daily totals of given day, or of every day if date is None """
+        params = {"user_id": self._user_id, "day": date}
+        day_filter = "" if date is None else " AND day = :day"
+        self._connection.execute(f"DELETE FROM daily_totals WHERE user_id = :user_id{day_filter}", params)
+        self._connection.execute(
+            f"INSERT INTO daily_totals (user_id, day, products_count, {_NUTRIENT_COLUMNS}, {_UNKNOWN_COLUMNS}) "
+            f"SELECT e.user_id, e.day, COUNT(*), "
+            f"{', '.join(f'TOTAL(t.{field} * e.weight / 100)' for field in Nutrients._fields)}, "
+            f"{', '.join(f'COUNT(*) - COUNT(t.{field})' for field in Nutrients._fields)} "
+            f"FROM eaten_products e JOIN product_types t ON t.id = e.product_type_id "
+            f"WHERE e.user_id = :user_id{day_filter} GROUP BY e.day", params)
+
+    def record(self, data: dict, operation: str, *args):
+        with self.lock, self._connection:
+            if self._user_id is None:
+                self._write_all(data)
+                return
+            getattr(self, "_record_" + operation)(*args)
+
+    def save(self, data: dict):
+        with self.lock, self._connection:
+            self._write_all(data)
+
+    def _write_all(self, data: dict):
+        """ Replaces everything stored about the user with given data. Has to be called inside a transaction """
+        if self._user_id is None:
+            self._user_id = self._connection.execute("INSERT INTO users (name) VALUES (?)",
+                                                     (self.username,)).lastrowid
+        self._record_set_user_parameters(data["gender"], data["age"], data["height"], data["weight"])
+        self._record_set_limits(data["limits"])
+        self._connection.execute("DELETE FROM custom_products WHERE user_id = ?", (self._user_id,))
+        for product_type in data["custom_products"]:
+            self._record_add_custom_product(product_type)
+        # Only loaded days are present in the eat history, the other ones stay untouched
+        for date, products in sorted(data["eat_history"].items()):
+            self._connection.execute("DELETE FROM eaten_products WHERE user_id = ? AND day = ?",
+                                     (self._user_id, date))
+            for product in products:
+                self._insert_eaten_product(date, product)
+            self._update_daily_totals(date)
+        self._write_recent_products(data["recent_products"])
+
+    def _recent_products(self) -> RecentProducts:
+        rows = self._connection.execute("SELECT product_type_id, uses FROM recent_products WHERE user_id = ? "
+                                        "ORDER BY position", (self._user_id,)).fetchall()
+        return RecentProducts(entries=[(self._product_type(type_id), uses) for type_id, uses in rows])
+
+    def _write_recent_products(self, recent_products: RecentProducts):
+        self._connection.execute("DELETE FROM recent_products WHERE user_id = ?", (self._user_id,))
+        self._connection.executemany(
+            "INSERT INTO recent_products (user_id, position, product_type_id, uses) VALUES (?, ?, ?, ?)",
+            [(self._user_id, position, self._product_type_id(product_type), uses)
+             for position, (product_type, uses) in enumerate(recent_products.entries())])
+
+    def _product_type(self, type_id: int) -> ProductType:
+        """ Returns product type stored under given id, the same object is returned for the same id """
+        if type_id not in self._product_types:
+            row = self._connection.execute(f"SELECT name, description, {_NUTRIENT_COLUMNS} FROM product_types "
+                                           f"WHERE id = ?", (type_id,)).fetchone()
+            product_type = ProductType(row[0])
+            product_type.description = row[1]
+            product_type.nutrients = Nutrients(*row[2:])
+            ingredients = self._connection.execute("SELECT ingredient_type_id, weight FROM product_ingredients "
+                                                   "WHERE product_type_id = ? ORDER BY position", (type_id,)).fetchall()
+            if ingredients:
+                product_type.ingredients = tuple(Product(self._product_type(ingredient_type_id), weight)
+                                                 for ingredient_type_id, weight in ingredients)
+                product_type.partial_nutrients = combine_nutrients(product_type.ingredients)[1]
+            product_type = intern_product_type(product_type)
+            self._product_types[type_id] = product_type
+            self._product_type_ids.setdefault(product_type, type_id)
+        return self._product_types[type_id]
+
+    def _product_type_id(self, product_type: ProductType) -> int:
+        """
+        Returns id of given product type, inserts it to the database if there is no product type with the same content
+        """
+        if product_type not in self._product_type_ids:
+            content_id = product_type.content_id()
+            row = self._connection.execute("SELECT id FROM product_types WHERE content_id = ?",
+                                           (content_id,)).fetchone()
+            if row:
+                type_id = row[0]
+            else:
+                type_id = self._connection.execute(
+                    f"INSERT INTO product_types (name, description, content_id, {_NUTRIENT_COLUMNS}) "
+                    f"VALUES ({', '.join('?' * (len(Nutrients._fields) + 3))})",
+                    (product_type.name, product_type.description, content_id, *product_type.nutrients)).lastrowid
+                self._connection.executemany(
+                    "INSERT INTO product_ingredients (product_type_id, position, ingredient_type_id, weight) "
+                    "VALUES (?, ?, ?, ?)", [(type_id, position, self._product_type_id(ingredient.product_type),
+                                             ingredient.weight)
+                                            for position, ingredient in enumerate(product_type.ingredients)])
+            self._product_types.setdefault(type_id, product_type)
+            self._product_type_ids[product_type] = type_id
+        return self._product_type_ids[product_type]
+
+    def _record_add_custom_product(self, product_type: ProductType):
+        self._connection.execute("INSERT INTO custom_products (user_id, product_type_id) VALUES (?, ?)",
+                                 (self._user_id, self._product_type_id(product_type)))
+
+    def _record_del_custom_product(self, index: int):
+        self._connection.execute("DELETE FROM custom_products WHERE id = (SELECT id FROM custom_products "
+                                 "WHERE user_id = ? ORDER BY id LIMIT 1 OFFSET ?)", (self._user_id, index))
+
+    def _record_replace_custom_products(self, replacements: list[tuple[int, ProductType]]):
+        for index, product_type in replacements:
+            self._connection.execute(
+                "UPDATE custom_products SET product_type_id = ? WHERE id = (SELECT id FROM custom_products "
+                "WHERE user_id = ? ORDER BY id LIMIT 1 OFFSET ?)", (self._product_type_id(product_type),
+                                                                    self._user_id, index))
+
+    def _record_add_eaten_product(self, date: Day, product: Product):
+        self._insert_eaten_product(date, product)
+        self._update_daily_totals(date)
+
+    def _insert_eaten_product(self, date: Day, product: Product):
+        self._connection.execute("INSERT INTO eaten_products (user_id, day, product_type_id, weight) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 (self._user_id, date, self._product_type_id(product.product_type),
+                                  product.weight))
+
+    def _record_del_eaten_product(self, date: Day, index: int):
+        self._connection.execute("DELETE FROM eaten_products WHERE id = (SELECT id FROM eaten_products "
+                                 "WHERE user_id = ? AND day = ? ORDER BY id LIMIT 1 OFFSET ?)",
+                                 (self._user_id, date, index))
+        self._update_daily_totals(date)
+
+    def _record_set_user_parameters(self, gender: str, age: int, height: float, weight: float):
+        self._connection.execute("UPDATE users SET gender = ?, age = ?, height = ?, weight = ? WHERE id = ?",
+                                 (gender, age, height, weight, self._user_id))
+
+    def _record_set_limits(self, limits: Nutrients):
+        self._connection.execute(f"UPDATE users SET ({_LIMIT_COLUMNS}) = ({', '.join('?' * len(limits))}) "
+                                 f"WHERE id = ?", (*limits, self._user_id))
+
+    def _record_use_product(self, product_type: ProductType):
+        # Cache is small, so it is loaded and written whole, evictions are decided by RecentProducts only
+        recent_products = self._recent_products()
+        recent_products.use(product_type)
+        self._write_recent_products(recent_products)
@@ -0,0 +1,45 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+_IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module: str = "GUI_main_window") -> list[tuple[str, int, int]]:
+    """
+    Imports the module in a new interpreter with -X importtime
+
+    :return: List of (module name, self time, cumulative time) tuples for modules imported directly by the interpreter
+             or by the first level of imports, times are in microseconds
+    """
+    environment = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=environment, check=True)
+    times = []
+    for match in _IMPORT_TIME_LINE.finditer(result.stderr):
+        if len(match.group(3)) <= 3:
+            times.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return times
+
+
+def startup_report(module: str = "GUI_main_window", runs: int = 5, top: int = 10):
+    """ Prints median cumulative import time of the module and its slowest imports """
+    totals = []
+    slowest = {}
+    for _ in range(runs):
+        times = import_times(module)
+        totals.append(next(cumulative for name, _, cumulative in times if name == module))
+        for name, _, cumulative in times:
+            slowest.setdefault(name, []).append(cumulative)
+    print(f"import {module}: {statistics.median(totals) / 1000:.1f} ms (median of {runs} runs)")
+    medians = sorted(((statistics.median(values), name) for name, values in slowest.items() if name != module),
+                     reverse=True)
+    for cumulative, name in medians[:top]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    """ startup time report: python startup_time.py [module] """
+    startup_report(*sys.argv[1:2])
@@ -0,0 +1,504 @@
+import atexit
+import io
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+
+from products import ProductType, Product, intern_product_type
+from days import Day, from_ymd
+
+_EMPTY_DAY = pickle.dumps([])
+
+
+class _FileState:
+    """
+    State shared by all storages working on the same file. Only one storage at a time may load and write user data
+    of the file (its owner), others would overwrite its mutations with their own copy of the data
+    """
+    def __init__(self):
+        self.lock = threading.RLock()               # Guards user data
+        self.compaction_lock = threading.Lock()     # Allows only one compaction of the file at a time
+        self.journal_lock = threading.Lock()        # Guards the journal file, taken after lock if both are needed
+        self.pending_lock = threading.Lock()        # Guards pending, taken after journal_lock if both are needed
+        self.pending: list[tuple[int, bytes]] = []  # (seq, record) of mutations not written to the journal yet
+        self.last_seq = 0                           # Sequence number of the last recorded mutation
+        self.snapshot_seq = 0                       # Sequence number of the last mutation included in the snapshot
+        self.compacting = False
+        self.owner: weakref.ref | None = None       # Storage, that loaded or wrote the file, while it is alive
+        self.journal_filename: str | None = None
+        self.write_error: Exception | None = None   # Error of the last failed writing of pending records
+
+    def write_pending(self):
+        """ Appends pending records to the journal, records already included in the snapshot are dropped """
+        with self.journal_lock:
+            with self.pending_lock:
+                pending = self.pending[:]
+            records = [record for seq, record in pending if seq > self.snapshot_seq]
+            if records:
+                with open(self.journal_filename, 'ab') as file:
+                    file.write(b"".join(records))
+                    file.flush()
+                    os.fsync(file.fileno())
+            with self.pending_lock:
+                del self.pending[:len(pending)]
+            self.write_error = None
+
+
+_file_states: dict[str, _FileState] = {}
+_file_states_lock = threading.Lock()
+
+
+def _file_state(filename: str) -> _FileState:
+    with _file_states_lock:
+        return _file_states.setdefault(os.path.abspath(filename), _FileState())
+
+
+class _BackgroundWriter:
+    """
+    Thread writing mutations recorded by storages, so that they do not wait for the disk. After the first mutation
+    the writer waits write_delay seconds, mutations recorded meanwhile and during writing are written together
+    """
+    def __init__(self, write_delay: float = 0.05):
+        self.write_delay = write_delay
+        self._condition = threading.Condition()
+        self._scheduled: dict[int, _FileState] = {}    # Files with pending mutations, storages may be gone meanwhile
+        self._writing = False
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, state: _FileState):
+        """ Makes the thread write pending mutations of the file """
+        with self._condition:
+            self._scheduled.setdefault(id(state), state)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="storage writer", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self):
+        """ Blocks until all the scheduled writes are done, or the thread is not running anymore """
+        with self._condition:
+            while (self._scheduled or self._writing) and self._thread.is_alive():
+                self._condition.wait(0.1)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._scheduled:
+                    self._condition.wait()
+                self._writing = True
+            time.sleep(self.write_delay)
+            with self._condition:
+                scheduled, self._scheduled = self._scheduled, {}
+            try:
+                for state in scheduled.values():
+                    try:
+                        state.write_pending()
+                    except Exception as e:
+                        # Mutations stay pending, they are written by the next write or flush, which raises the error
+                        state.write_error = e
+                        print(f"Error: writing {state.journal_filename} failed: {e!r}")
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+
+_writer = _BackgroundWriter()
+
+
+def flush_all():
+    """ Writes mutations recorded by all the storages, called also at exit of the interpreter """
+    _writer.flush()
+    for state in list(_file_states.values()):
+        if state.pending:
+            raise OSError(f"{len(state.pending)} recorded mutations could not be written") from state.write_error
+
+
+atexit.register(flush_all)
+
+
+def atomic_write(filename: str, payload: bytes):
+    """ Writes payload to a temporary file and replaces the target with it, so the file is never half-written """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix=os.path.basename(filename), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+class _Unpickler(pickle.Unpickler):
+    """
+    Unpickler of user data, which replaces QDate objects pickled by older versions with days, so loading does not
+    need Qt. Counts replaced dates, so outdated files can be rewritten
+    """
+    def __init__(self, file):
+        super().__init__(file)
+        self.upgraded_dates = 0
+
+    def find_class(self, module: str, name: str):
+        if (module, name) == ("PySide6.QtCore", "QDate"):
+            return self._day_from_ymd
+        return super().find_class(module, name)
+
+    def _day_from_ymd(self, year: int, month: int, day: int) -> Day:
+        self.upgraded_dates += 1
+        return from_ymd(year, month, day)
+
+
+def _loads(payload: bytes) -> tuple:
+    """ Unpickles payload, which may contain QDate objects pickled by older versions """
+    return _Unpickler(io.BytesIO(payload)).load()
+
+
+def _read_snapshot_file(filename: str) -> tuple[dict, int, dict, dict, bool]:
+    """
+    Reads a snapshot file. It consists of pickled user data, optionally followed by the sequence number of the last
+    mutation included in it, a dict with pickled list of products for each day of the eat history and a table of
+    product types referenced from these lists
+
+    :return: tuple in a form (data, seq, days, product_types, outdated), where days maps days to pickled or already
+             loaded products lists, product_types maps content ids to interned product types and outdated is True
+             if the snapshot has to be rewritten in the current format
+    """
+    with open(filename, 'rb') as file:
+        unpicklers = [_Unpickler(file) for _ in range(4)]   # Pickles are separate, each has its own memo
+        data = unpicklers[0].load()
+        seq, days, product_types = 0, {}, {}
+        outdated = False
+        try:
+            seq = unpicklers[1].load()
+            days = unpicklers[2].load()
+            product_types = unpicklers[3].load()
+        except EOFError:
+            outdated = True     # Snapshot written by an older version
+    days.update(data["eat_history"])
+    data["eat_history"] = {}
+    product_types = {content_id: intern_product_type(product_type)
+                     for content_id, product_type in product_types.items()}
+    return data, seq, days, product_types, outdated or any(unpickler.upgraded_dates for unpickler in unpicklers)
+
+
+class _DayPickler(pickle.Pickler):
+    """ Pickles product types as references to a product types table, so each of them is stored once """
+    def __init__(self, file, product_types: dict[str, ProductType]):
+        super().__init__(file)
+        self.product_types = product_types
+
+    def persistent_id(self, obj):
+        if isinstance(obj, ProductType):
+            content_id = obj.content_id()
+            self.product_types.setdefault(content_id, obj)
+            return content_id
+        return None
+
+
+class _DayUnpickler(_Unpickler):
+    """ Resolves references to the product types table made by _DayPickler """
+    def __init__(self, file, product_types: dict[str, ProductType]):
+        super().__init__(file)
+        self.product_types = product_types
+
+    def persistent_load(self, content_id: str) -> ProductType:
+        return self.product_types[content_id]
+
+
+def _pickled_day(products: list[Product], product_types: dict[str, ProductType]) -> bytes:
+    """ Pickles products eaten at one day, adding their product types to the product_types table """
+    buffer = io.BytesIO()
+    _DayPickler(buffer, product_types).dump(products)
+    return buffer.getvalue()
+
+
+def _unpickled_day(day: bytes | list[Product], product_types: dict[str, ProductType]) -> list[Product]:
+    """ Unpickles products eaten at one day, their product types are interned """
+    products = _DayUnpickler(io.BytesIO(day), product_types).load() if isinstance(day, bytes) else day
+    for product in products:
+        product.product_type = intern_product_type(product.product_type)
+    return products
+
+
+class UserStorage:
+    """
+    Base class for user data storages. Every mutation of user data is passed to record().
+    Storages with lazy_history set to True do not load the whole eat history, days are requested through
+    load_eaten_days(first, last) and released with release_day(date, products) when they are no longer needed.
+    Daily nutrients totals are a part of user data and are always loaded whole.
+    """
+    lazy_history = False
+
+    def __init__(self, filename: str):
+        """
+        :param filename: Name of the file with the user data snapshot
+        """
+        self.filename = filename
+        self._state = _file_state(filename)
+
+    @property
+    def lock(self) -> threading.RLock:
+        """ Lock, that has to be held while mutating user data """
+        return self._state.lock
+
+    def load(self) -> tuple[dict, list[tuple[str, tuple]]]:
+        """
+        Loads user data
+
+        :return: tuple in a form (data, journal) where:
+            data - user data from the last snapshot
+            journal - list of (operation, args) mutations, that have to be replayed on top of data
+        :raise FileNotFoundError: if there is no data for the user
+        """
+        raise NotImplementedError
+
+    def record(self, data: dict, operation: str, *args):
+        """
+        Persists a mutation, which has been already applied to data
+
+        :param data: Whole user data after the mutation
+        :param operation: Name of the mutation
+        :param args: Arguments of the mutation
+        """
+        raise NotImplementedError
+
+    def save(self, data: dict):
+        """ Writes the whole user data """
+        raise NotImplementedError
+
+    def load_eaten_days(self, first: Day, last: Day) -> dict[Day, list[Product]]:
+        """ Returns products eaten at days between first and last date (inclusive), days without products are omitted """
+        raise NotImplementedError
+
+    def load_eaten_products(self, date: Day) -> list[Product]:
+        """ Returns products eaten at given date """
+        return self.load_eaten_days(date, date).get(date, [])
+
+    def release_day(self, date: Day, products: list[Product]):
+        """ Called when the user does not keep products eaten at given date loaded anymore """
+        pass
+
+    def history_range(self) -> tuple[Day, Day] | None:
+        """ Returns the first and the last date of the eat history, None if the history is empty """
+        raise NotImplementedError
+
+    def flush(self):
+        """ Blocks until all recorded mutations are written """
+        pass
+
+    def filenames(self) -> list[str]:
+        """ Returns names of the files holding user data, the main one first """
+        return [self.filename]
+
+    def has_data(self) -> bool:
+        """ Checks if any user data has been written """
+        return os.path.exists(self.filename)
+
+
+class JournalStorage(UserStorage):
+    """
+    Storage keeping a snapshot of user data and an append-only journal with one record per mutation.
+    Records are appended by a background writer, records of a burst of mutations are written and synced at once.
+    Until then they are pending in memory, a storage opening the file again meanwhile loads them from there.
+    Only one storage of a file can be in use at a time, opening another one raises RuntimeError.
+    After compact_after records, the journal is compacted into a new snapshot by a background thread.
+
+    Snapshot file holds pickled user data without the eat history, followed by the sequence number of the last
+    mutation it includes and the eat history pickled separately for each day, so days can be loaded lazily.
+    Products of the days refer to product types by content id, product types are pickled once in a separate table.
+    Journal record is a header with length and crc32 of the payload followed by the pickled (seq, operation, args)
+    tuple. Damaged tail of the journal (e.g. after a crash during writing) is ignored and cut off.
+    """
+    lazy_history = True
+    _header = struct.Struct("<II")
+
+    def __init__(self, filename: str, compact_after: int = 500):
+        """
+        :param filename: Name of the file with the user data snapshot
+        :param compact_after: Number of journal records, after which the journal is compacted into the snapshot
+        """
+        super().__init__(filename)
+        self.journal_filename = self._state.journal_filename = os.path.splitext(filename)[0] + ".journal"
+        self.compact_after = compact_after
+        self._data = None
+        self._days: dict[Day, bytes | list[Product]] = {}      # Days of the eat history not loaded by the user
+        self._product_types: dict[str, ProductType] = {}        # Product types referenced from pickled days
+        self._outdated = False          # Snapshot is in an older format, it is rewritten on the first mutation
+        self._compaction_thread: threading.Thread | None = None
+
+    def load(self) -> tuple[dict, list[tuple[str, tuple]]]:
+        """
+        :raise RuntimeError: if another storage of the same file is in use
+        """
+        with self.lock:
+            self._claim()
+            data, snapshot_seq, self._days, self._product_types, self._outdated = self._read_snapshot()
+            journal = []
+            last_seq = snapshot_seq
+            for seq, operation, args in self._read_journal():
+                if seq > snapshot_seq:
+                    journal.append((operation, args))
+                    last_seq = max(last_seq, seq)
+            self._state.snapshot_seq = max(self._state.snapshot_seq, snapshot_seq)
+            self._state.last_seq = max(self._state.last_seq, last_seq)
+            return data, journal
+
+    def record(self, data: dict, operation: str, *args):
+        with self.lock:
+            self._claim()
+            self._data = data
+            if not os.path.exists(self.filename):
+                # Journal has to be replayed on top of a snapshot, so the first one is written at once
+                atomic_write(self.filename, self._snapshot_payload(self._state.last_seq))
+                self._state.snapshot_seq = self._state.last_seq
+                return
+            self._state.last_seq += 1
+            payload = pickle.dumps((self._state.last_seq, operation, args))
+            with self._state.pending_lock:
+                self._state.pending.append((self._state.last_seq,
+                                            self._header.pack(len(payload), zlib.crc32(payload)) + payload))
+            _writer.schedule(self._state)
+            if self._outdated or self._state.last_seq - self._state.snapshot_seq >= self.compact_after:
+                self._outdated = False
+                self.compact_in_background()
+
+    def write_pending(self):
+        """ Appends pending records to the journal, records already included in the snapshot are dropped """
+        self._state.write_pending()
+
+    def filenames(self) -> list[str]:
+        return [self.filename, self.journal_filename]
+
+    def flush(self):
+        _writer.flush()
+        if self._state.pending:
+            self.write_pending()    # Writing in the background failed, the error is raised here
+
+    def save(self, data: dict):
+        with self.lock:
+            self._claim()
+            self._data = data
+        self.compact()
+
+    def _claim(self):
+        """ Makes this storage the owner of the file, unless another storage of the file is still in use """
+        owner = self._state.owner() if self._state.owner else None
+        if owner is not None and owner is not self:
+            raise RuntimeError(f"{self.filename} is already opened by another storage")
+        self._state.owner = weakref.ref(self)
+
+    def load_eaten_days(self, first: Day, last: Day) -> dict[Day, list[Product]]:
+        with self.lock:
+            return {date: _unpickled_day(day, self._product_types) for date, day in self._days.items()
+                    if first <= date <= last}
+
+    def release_day(self, date: Day, products: list[Product]):
+        with self.lock:
+            if products:
+                self._days[date] = _pickled_day(products, self._product_types)
+            else:
+                self._days.pop(date, None)
+
+    def history_range(self) -> tuple[Day, Day] | None:
+        with self.lock:
+            dates = [date for date, products in self._days.items() if products]
+            if self._data:
+                dates += [date for date, products in self._data["eat_history"].items() if products]
+            return (min(dates), max(dates)) if dates else None
+
+    def compact_in_background(self):
+        """ Starts compaction of the journal into the snapshot in a separate thread, if it is not already running """
+        with self.lock:
+            if self._state.compacting:
+                return
+            self._state.compacting = True
+        self._compaction_thread = threading.Thread(target=self._compact_thread, name=f"compact {self.filename}")
+        self._compaction_thread.start()
+
+    def wait_for_compaction(self):
+        """ Blocks until background compaction started by this storage finishes """
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+
+    def _compact_thread(self):
+        try:
+            self.compact()
+        finally:
+            with self.lock:
+                self._state.compacting = False
+
+    def compact(self):
+        """ Writes current data as a new snapshot and removes journal records included in it """
+        with self._state.compaction_lock:
+            with self.lock:
+                seq = self._state.last_seq
+                if self._data is None or (seq <= self._state.snapshot_seq and os.path.exists(self.filename)):
+                    return
+                payload = self._snapshot_payload(seq)
+            atomic_write(self.filename, payload)
+            with self.lock, self._state.journal_lock:
+                self._state.snapshot_seq = seq
+                remaining = [record for record in self._read_raw_journal() if record[0] > seq]
+                if remaining:
+                    atomic_write(self.journal_filename, b"".join(raw for _, raw in remaining))
+                elif os.path.exists(self.journal_filename):
+                    os.remove(self.journal_filename)
+
+    def _snapshot_payload(self, seq: int) -> bytes:
+        """ Serializes the snapshot. Days loaded by the user are taken from the user data, the other ones as they are """
+        days = {date: day if isinstance(day, bytes) else _pickled_day(day, self._product_types)
+                for date, day in self._days.items()}
+        days.update({date: _pickled_day(products, self._product_types)
+                     for date, products in self._data["eat_history"].items()})
+        data = dict(self._data, eat_history={})
+        return (pickle.dumps(data) + pickle.dumps(seq) +
+                pickle.dumps({date: day for date, day in days.items() if day != _EMPTY_DAY}) +
+                pickle.dumps(self._product_types))
+
+    def _read_snapshot(self) -> tuple[dict, int, dict, dict, bool]:
+        try:
+            return _read_snapshot_file(self.filename)
+        except FileNotFoundError:
+            # Journal without a snapshot does not belong to any existing data
+            if os.path.exists(self.journal_filename):
+                os.remove(self.journal_filename)
+            raise
+
+    def _read_journal(self) -> list[tuple[int, str, tuple]]:
+        """ Returns (seq, operation, args) of the records in the journal file and of the pending ones """
+        with self._state.journal_lock:
+            records = self._read_raw_journal()
+            with self._state.pending_lock:
+                records += self._state.pending
+        return [_loads(raw[self._header.size:]) for _, raw in records]
+
+    def _read_raw_journal(self) -> list[tuple[int, bytes]]:
+        """ Returns list of (seq, raw record) tuples. Cuts off the damaged tail of the journal """
+        try:
+            with open(self.journal_filename, 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            return []
+        records = []
+        offset = 0
+        while offset + self._header.size <= len(content):
+            length, crc = self._header.unpack_from(content, offset)
+            end = offset + self._header.size + length
+            payload = content[offset + self._header.size:end]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append((_loads(payload)[0], content[offset:end]))
+            offset = end
+        if offset < len(content):
+            with open(self.journal_filename, 'r+b') as file:
+                file.truncate(offset)
+        return records
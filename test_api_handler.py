@@ -0,0 +1,109 @@
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import api_handler
+from api_cache import ResponseCache
+from local_food_db import LocalFoodDatabase
+
+_FOODS = [{"food_name": "Bread", "nix_item_id": "bread"}]
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """ Stand-in of the nutritionix api answering with scripted statuses, then with search results """
+    statuses: list[int] = []    # Statuses of the next responses, 200 when empty
+    retry_after = "0"           # Retry-After header sent with the error statuses, not sent if None
+    delay = 0.0                 # Seconds before answering
+    hits = 0
+
+    def do_GET(self):
+        _ApiHandler.hits += 1
+        time.sleep(self.delay)
+        status = _ApiHandler.statuses.pop(0) if _ApiHandler.statuses else 200
+        payload = json.dumps({"branded": _FOODS} if status == 200 else {"message": "unavailable"}).encode()
+        try:
+            self.send_response(status)
+            if status != 200 and self.retry_after is not None:
+                self.send_header("Retry-After", self.retry_after)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass    # Client stopped waiting
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadResponseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _ApiHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.saved_settings = (api_handler.base_url, api_handler.headers_filename, api_handler.response_cache,
+                              api_handler.local_database, api_handler.read_timeout, api_handler.backoff_factor)
+        headers_filename = os.path.join(cls.directory.name, "headers.json")
+        with open(headers_filename, 'w') as file:
+            json.dump({"x-app-id": "test", "x-app-key": "test"}, file)
+        api_handler.base_url = f"http://127.0.0.1:{cls.server.server_port}/v2/"
+        api_handler.headers_filename = headers_filename
+        api_handler.local_database = LocalFoodDatabase(os.path.join(cls.directory.name, "foods.sqlite3"))
+        api_handler.backoff_factor = 0.01
+
+    @classmethod
+    def tearDownClass(cls):
+        (api_handler.base_url, api_handler.headers_filename, api_handler.response_cache, api_handler.local_database,
+         api_handler.read_timeout, api_handler.backoff_factor) = cls.saved_settings
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.directory.cleanup()
+
+    def setUp(self):
+        _ApiHandler.statuses = []
+        _ApiHandler.retry_after = "0"
+        _ApiHandler.delay = 0.0
+        _ApiHandler.hits = 0
+        api_handler.read_timeout = 10
+        api_handler.response_cache = ResponseCache(os.path.join(self.directory.name, f"{self._testMethodName}.sqlite3"))
+
+    def test_retries_after_unavailable_and_too_many_requests(self):
+        _ApiHandler.statuses = [503, 429]
+        results = api_handler.search_food("bread")
+        self.assertEqual(_ApiHandler.hits, 3)
+        self.assertEqual(results.products, _FOODS)
+        self.assertTrue(results.remote)
+
+    def test_gives_up_after_max_retries(self):
+        _ApiHandler.statuses = [503] * (api_handler.max_retries + 5)
+        _ApiHandler.retry_after = None      # Exponential backoff is used
+        self.assertIsNone(api_handler._get_response(api_handler.base_url + "search/instant", {'query': "bread"}))
+        self.assertEqual(_ApiHandler.hits, api_handler.max_retries + 1)
+
+    def test_read_timeout(self):
+        _ApiHandler.delay = 2
+        api_handler.read_timeout = 0.2
+        start = time.monotonic()
+        self.assertIsNone(api_handler._get_response(api_handler.base_url + "search/instant", {'query': "bread"}))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(_ApiHandler.hits, 1)
+
+    def test_retry_delay(self):
+        self.assertEqual(api_handler._retry_delay(0, "2"), 2)
+        self.assertEqual(api_handler._retry_delay(0, "-5"), 0)
+        self.assertEqual(api_handler._retry_delay(0, str(api_handler.max_backoff * 10)), api_handler.max_backoff)
+        self.assertAlmostEqual(api_handler._retry_delay(0, formatdate(time.time() + 3, usegmt=True)), 3, delta=1.1)
+        for retry in range(5):
+            self.assertLessEqual(api_handler._retry_delay(retry, None), api_handler.backoff_factor * 2 ** retry)
+            self.assertLessEqual(api_handler._retry_delay(retry, "not a date"), api_handler.backoff_factor * 2 ** retry)
+
+
+if __name__ == '__main__':
+    unittest.main()
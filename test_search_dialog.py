@@ -0,0 +1,156 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import gc
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication
+
+import api_handler
+from api_cache import ResponseCache
+from local_food_db import LocalFoodDatabase
+from GUI_search_dialog import SearchProductsDialog
+
+_FOODS = [{"food_name": f"Bread {idx}", "nix_item_id": f"bread{idx}", "nf_calories": 250 + idx} for idx in range(3)]
+_REMOTE_ONLY_FOODS = [{"food_name": "Apple pie", "nix_item_id": "pie", "nf_calories": 237}]
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """ Stand-in of the nutritionix api answering search/instant and search/item requests """
+    delay = 0.2         # Seconds before answering, so the dialog keeps processing events meanwhile
+    queries: list[str] = []     # Queries of the received search requests
+    item_ids: list[str] = []    # Products of the received nutrition requests
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        time.sleep(self.delay)
+        if url.path.endswith("search/instant"):
+            query = params["query"][0].lower()
+            _ApiHandler.queries.append(query)
+            body = {"branded": [food for food in _FOODS + _REMOTE_ONLY_FOODS if query in food["food_name"].lower()]}
+        else:
+            _ApiHandler.item_ids.append(params["nix_item_id"][0])
+            body = {"foods": [food for food in _FOODS if food["nix_item_id"] == params["nix_item_id"][0]]}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SearchProductsDialogTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _ApiHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.saved_settings = (api_handler.base_url, api_handler.headers_filename, api_handler.response_cache,
+                              api_handler.local_database)
+        headers_filename = os.path.join(cls.directory.name, "headers.json")
+        with open(headers_filename, 'w') as file:
+            json.dump({"x-app-id": "test", "x-app-key": "test"}, file)
+        api_handler.base_url = f"http://127.0.0.1:{cls.server.server_port}/v2/"
+        api_handler.headers_filename = headers_filename
+        api_handler.response_cache = ResponseCache(os.path.join(cls.directory.name, "api_cache.sqlite3"))
+        api_handler.local_database = LocalFoodDatabase(os.path.join(cls.directory.name, "foods.sqlite3"))
+
+    @classmethod
+    def tearDownClass(cls):
+        (api_handler.base_url, api_handler.headers_filename, api_handler.response_cache,
+         api_handler.local_database) = cls.saved_settings
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.directory.cleanup()
+
+    def setUp(self):
+        SearchProductsDialog.found_products_cache.clear()
+        _ApiHandler.queries.clear()
+        _ApiHandler.item_ids.clear()
+        # Responses cached by other tests would hide requests
+        api_handler.response_cache = ResponseCache(os.path.join(self.directory.name, f"{self._testMethodName}.sqlite3"))
+        self.dialog = SearchProductsDialog()
+
+    def tearDown(self):
+        self.dialog.done(0)
+        self.dialog.deleteLater()
+        self.wait_for(lambda: not api_handler._in_flight)  # Prefetching already started reaches the next test otherwise
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            QTest.qWait(20)
+            gc.collect()    # Objects kept alive only by Python references are deleted, while tasks are running
+        return condition()
+
+    def test_search_results_are_displayed(self):
+        self.dialog.text_search.setText("bread")
+        self.dialog.search()
+        self.assertEqual(self.dialog.label_widget_title.text(), "Searching...")
+        self.assertTrue(self.wait_for(lambda: self.dialog.list_widget.count() == len(_FOODS)))
+        self.assertEqual(self.dialog.label_widget_title.text(), "Search results")
+        self.assertEqual(self.dialog.found_products, _FOODS)
+
+    def test_only_latest_search_is_displayed(self):
+        self.dialog.text_search.setText("xyz")
+        self.dialog.search()
+        self.dialog.text_search.setText("bread 1")
+        self.dialog.search()
+        self.assertTrue(self.wait_for(lambda: self.dialog.label_widget_title.text() == "Search results"))
+        QTest.qWait(int(_ApiHandler.delay * 2000))
+        self.assertEqual([product["food_name"] for product in self.dialog.found_products], ["Bread 1"])
+
+    def test_selected_product_info_is_downloaded(self):
+        self.dialog.found_products_cache["bread"] = api_handler.SearchResults(_FOODS, True)
+        self.dialog.text_search.setText("bread")
+        self.dialog.search()
+        self.dialog.cancel_prefetch()
+        self.dialog.list_widget.setCurrentRow(2)
+        self.dialog.add_selected_product()
+        self.assertTrue(self.wait_for(lambda: self.dialog.selected_product_type is not None))
+        self.assertEqual(self.dialog.selected_product_type.name, "Bread 2")
+        self.assertEqual(self.dialog.selected_product_type.nutrients.nf_calories, 252)
+
+    def test_local_results_do_not_block_api_search(self):
+        saved_database = api_handler.local_database
+        api_handler.local_database = LocalFoodDatabase(os.path.join(self.directory.name, "apples.sqlite3"))
+        try:
+            api_handler.local_database.import_products([{"food_name": "Apple", "nf_calories": 52}])
+            self.dialog.text_search.setText("apple")
+            self.dialog.search()
+            self.assertTrue(self.wait_for(lambda: self.dialog.label_widget_title.text() == "Search results"))
+            self.assertEqual([product["food_name"] for product in self.dialog.found_products], ["Apple"])
+            self.dialog.text_search.setText("apple pie")
+            self.dialog.query_edited()
+            self.dialog.search()
+            self.assertTrue(self.wait_for(lambda: self.dialog.found_products == _REMOTE_ONLY_FOODS))
+            self.assertEqual(_ApiHandler.queries, ["apple pie"])
+        finally:
+            api_handler.local_database = saved_database
+
+    def test_typing_does_not_prefetch(self):
+        self.dialog.found_products_cache["bread"] = api_handler.SearchResults(_FOODS, True)
+        for query in ("bread", "bread ", "bread 1"):
+            self.dialog.text_search.setText(query)
+            self.dialog.query_edited()
+        QTest.qWait(int(_ApiHandler.delay * 2000))
+        self.assertEqual([product["food_name"] for product in self.dialog.found_products], ["Bread 1"])
+        self.assertEqual(_ApiHandler.item_ids, [])
+        self.assertTrue(self.wait_for(lambda: _ApiHandler.item_ids == ["bread1"]))     # Debounced search is done
+        self.assertEqual(_ApiHandler.queries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
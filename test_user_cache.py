@@ -0,0 +1,75 @@
+import gc
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+import user
+from days import today
+from products import Product, ProductType
+from user_cache import UserCache
+
+_USERNAMES = [f"user{idx}" for idx in range(6)]
+
+
+class UserCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved_directory = user.data_directory
+        user.data_directory = self.directory.name
+        for username in _USERNAMES:
+            created = user.User(username)
+            created.add_eaten_product(Product(ProductType(f"{username} bread", nf_calories=250), 100), today())
+            created.close()
+        del created
+        gc.collect()
+
+    def tearDown(self):
+        user.data_directory = self.saved_directory
+        gc.collect()
+        self.directory.cleanup()
+
+    def test_evicted_user_in_use_is_reused(self):
+        cache = UserCache(capacity=2)
+        first = cache.get(_USERNAMES[0])
+        for username in _USERNAMES[1:]:
+            cache.put(first)
+            first_again = cache.get(username)
+            cache.put(first_again)
+            first = cache.get(_USERNAMES[0])
+        self.assertNotIn(_USERNAMES[1], cache)
+        held = cache.get(_USERNAMES[1])
+        cache.put(held)
+        for username in _USERNAMES[2:]:
+            cache.put(cache.get(username))
+        self.assertNotIn(_USERNAMES[1], cache)
+        self.assertIs(cache.get(_USERNAMES[1]), held)
+
+    def test_switching_back_to_user_referenced_by_dialog(self):
+        from GUI_main_window import MyMainWindow
+        from GUI_search_dialog import SearchProductsDialog
+        app = QApplication.instance() or QApplication([])
+        for preload_users in (False, True):
+            with self.subTest(preload_users=preload_users):
+                window = MyMainWindow(preload_users=preload_users)
+                window.select_user(0)
+                dialog = SearchProductsDialog(window, window.current_user)     # Kept by the window as its child
+                for idx in range(1, len(_USERNAMES)):
+                    window.select_user(idx)
+                window.select_user(0)
+                self.assertEqual(window.current_user.name, _USERNAMES[0])
+                self.assertIs(window.current_user, dialog.user)
+                self.assertEqual([product.product_type.name for product in window.current_user.get_eaten_products()],
+                                 [f"{_USERNAMES[0]} bread"])
+                window.close()
+                window.deleteLater()
+                app.processEvents()
+                del window, dialog
+                gc.collect()
+
+
+if __name__ == '__main__':
+    unittest.main()
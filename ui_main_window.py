@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+## Form generated from reading UI file 'main_window.ui'
+##
+## Created by: Qt User Interface Compiler version 6.7.1
+##
+## WARNING! All changes made in this file will be lost when recompiling UI file!
+################################################################################
+
+from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
+    QMetaObject, QObject, QPoint, QRect,
+    QSize, QTime, QUrl, Qt)
+from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
+    QCursor, QFont, QFontDatabase, QGradient,
+    QIcon, QImage, QKeySequence, QLinearGradient,
+    QPainter, QPalette, QPixmap, QRadialGradient,
+    QTransform)
+from PySide6.QtWidgets import (QApplication, QDateEdit, QGroupBox, QHBoxLayout,
+    QLabel, QLineEdit, QMainWindow, QMenu,
+    QMenuBar, QPushButton, QSizePolicy, QSpacerItem,
+    QStatusBar, QVBoxLayout, QWidget)
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        if not MainWindow.objectName():
+            MainWindow.setObjectName(u"MainWindow")
+        MainWindow.resize(366, 508)
+        palette = QPalette()
+        brush = QBrush(QColor(65, 65, 65, 255))
+        brush.setStyle(Qt.SolidPattern)
+        palette.setBrush(QPalette.Active, QPalette.Button, brush)
+        brush1 = QBrush(QColor(66, 66, 66, 255))
+        brush1.setStyle(Qt.SolidPattern)
+        palette.setBrush(QPalette.Inactive, QPalette.Button, brush1)
+        brush2 = QBrush(QColor(126, 126, 126, 255))
+        brush2.setStyle(Qt.SolidPattern)
+        palette.setBrush(QPalette.Disabled, QPalette.Button, brush2)
+        MainWindow.setPalette(palette)
+        self.actiondefault_User = QAction(MainWindow)
+        self.actiondefault_User.setObjectName(u"actiondefault_User")
+        self.actiondefault_User.setCheckable(True)
+        self.actiondefault_User.setChecked(True)
+        self.action_graph = QAction(MainWindow)
+        self.action_graph.setObjectName(u"action_graph")
+        self.action_set_parameters = QAction(MainWindow)
+        self.action_set_parameters.setObjectName(u"action_set_parameters")
+        self.action_set_limits = QAction(MainWindow)
+        self.action_set_limits.setObjectName(u"action_set_limits")
+        self.centralwidget = QWidget(MainWindow)
+        self.centralwidget.setObjectName(u"centralwidget")
+        self.verticalLayout = QVBoxLayout(self.centralwidget)
+        self.verticalLayout.setObjectName(u"verticalLayout")
+        self.date_select = QDateEdit(self.centralwidget)
+        self.date_select.setObjectName(u"date_select")
+
+        self.verticalLayout.addWidget(self.date_select)
+
+        self.label = QLabel(self.centralwidget)
+        self.label.setObjectName(u"label")
+
+        self.verticalLayout.addWidget(self.label)
+
+        self.list_widget_container = QGroupBox(self.centralwidget)
+        self.list_widget_container.setObjectName(u"list_widget_container")
+        self.list_widget_container.setFlat(True)
+        self.list_widget_container.setCheckable(False)
+        self.verticalLayout_2 = QVBoxLayout(self.list_widget_container)
+        self.verticalLayout_2.setObjectName(u"verticalLayout_2")
+        self.verticalLayout_2.setContentsMargins(0, 0, 0, 0)
+
+        self.verticalLayout.addWidget(self.list_widget_container)
+
+        self.groupBox_2 = QGroupBox(self.centralwidget)
+        self.groupBox_2.setObjectName(u"groupBox_2")
+        self.groupBox_2.setFlat(True)
+        self.horizontalLayout_2 = QHBoxLayout(self.groupBox_2)
+        self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
+        self.horizontalLayout_2.setContentsMargins(0, 0, 0, 0)
+        self.label_2 = QLabel(self.groupBox_2)
+        self.label_2.setObjectName(u"label_2")
+
+        self.horizontalLayout_2.addWidget(self.label_2)
+
+        self.text_calories = QLineEdit(self.groupBox_2)
+        self.text_calories.setObjectName(u"text_calories")
+        self.text_calories.setReadOnly(True)
+
+        self.horizontalLayout_2.addWidget(self.text_calories)
+
+
+        self.verticalLayout.addWidget(self.groupBox_2)
+
+        self.groupBox = QGroupBox(self.centralwidget)
+        self.groupBox.setObjectName(u"groupBox")
+        self.horizontalLayout = QHBoxLayout(self.groupBox)
+        self.horizontalLayout.setObjectName(u"horizontalLayout")
+        self.button_my_products = QPushButton(self.groupBox)
+        self.button_my_products.setObjectName(u"button_my_products")
+
+        self.horizontalLayout.addWidget(self.button_my_products)
+
+        self.horizontalSpacer = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+
+        self.horizontalLayout.addItem(self.horizontalSpacer)
+
+        self.button_add = QPushButton(self.groupBox)
+        self.button_add.setObjectName(u"button_add")
+        icon = QIcon(QIcon.fromTheme(u"list-add"))
+        self.button_add.setIcon(icon)
+
+        self.horizontalLayout.addWidget(self.button_add)
+
+        self.button_delete = QPushButton(self.groupBox)
+        self.button_delete.setObjectName(u"button_delete")
+        icon1 = QIcon(QIcon.fromTheme(u"list-remove"))
+        self.button_delete.setIcon(icon1)
+
+        self.horizontalLayout.addWidget(self.button_delete)
+
+
+        self.verticalLayout.addWidget(self.groupBox)
+
+        MainWindow.setCentralWidget(self.centralwidget)
+        self.menubar = QMenuBar(MainWindow)
+        self.menubar.setObjectName(u"menubar")
+        self.menubar.setGeometry(QRect(0, 0, 366, 22))
+        self.menu_users = QMenu(self.menubar)
+        self.menu_users.setObjectName(u"menu_users")
+        self.menuGraph = QMenu(self.menubar)
+        self.menuGraph.setObjectName(u"menuGraph")
+        MainWindow.setMenuBar(self.menubar)
+        self.statusbar = QStatusBar(MainWindow)
+        self.statusbar.setObjectName(u"statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+
+        self.menubar.addAction(self.menu_users.menuAction())
+        self.menubar.addAction(self.menuGraph.menuAction())
+        self.menuGraph.addAction(self.action_set_parameters)
+        self.menuGraph.addAction(self.action_set_limits)
+        self.menuGraph.addSeparator()
+        self.menuGraph.addAction(self.action_graph)
+
+        self.retranslateUi(MainWindow)
+
+        QMetaObject.connectSlotsByName(MainWindow)
+    # setupUi
+
+    def retranslateUi(self, MainWindow):
+        MainWindow.setWindowTitle(QCoreApplication.translate("MainWindow", u"Track Your Calories", None))
+        self.actiondefault_User.setText(QCoreApplication.translate("MainWindow", u"default User", None))
+        self.action_graph.setText(QCoreApplication.translate("MainWindow", u"Show graph", None))
+        self.action_set_parameters.setText(QCoreApplication.translate("MainWindow", u"Set user parameters", None))
+        self.action_set_limits.setText(QCoreApplication.translate("MainWindow", u"Set limits", None))
+        self.label.setText(QCoreApplication.translate("MainWindow", u"Eaten products", None))
+        self.list_widget_container.setTitle("")
+        self.groupBox_2.setTitle("")
+        self.label_2.setText(QCoreApplication.translate("MainWindow", u"Calories in total", None))
+        self.groupBox.setTitle("")
+        self.button_my_products.setText(QCoreApplication.translate("MainWindow", u"My products", None))
+        self.button_add.setText("")
+        self.button_delete.setText("")
+        self.menu_users.setTitle(QCoreApplication.translate("MainWindow", u"Users", None))
+        self.menuGraph.setTitle(QCoreApplication.translate("MainWindow", u"Statistics", None))
+    # retranslateUi
+
+
+UI_HASH = "92e57d1edc91a6335f4ef7a2277b442e3270cd36afa5fe9122c2e05e98de23c8"
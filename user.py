@@ -1,118 +1,357 @@
-from PySide6.QtCore import QDate
+from collections import OrderedDict, namedtuple
 from typing import TypedDict
 import re
 import os
-import pickle
 
-from products import ProductType, Product, Nutrients
+from days import Day, LAST_DAY, today
+from products import ProductType, Product, Nutrients, NutrientsTotals, ProductsArray, intern_product_type
+from storage import UserStorage, JournalStorage
+from sqlite_storage import SqliteStorage
+from product_index import ProductIndex
+from recipes import RecipeBook
+from recent_products import RecentProducts
+from users_manifest import UsersManifest
+import sqlite_storage
 
 MALE_STR = "Male"
 FEMALE_STR = "Female"
 
+# Storage engines for user data, storage_engine selects the one used by default
+JOURNAL_ENGINE = "journal"
+SQLITE_ENGINE = "sqlite"
+storage_engine = JOURNAL_ENGINE
+data_directory = "."                    # Directory with user data and the users manifest
+sqlite_filename = "users.sqlite3"       # Name of the database file in the data directory
+manifest_filename = "users.json"        # Name of the users manifest file in the data directory
 
-def current_date() -> QDate:
-    return QDate.currentDate()
+_EMPTY_TOTALS = NutrientsTotals()
+_manifest: UsersManifest | None = None
+
+
+def _data_path(filename: str) -> str:
+    return os.path.join(data_directory, filename)
 
 
 def _user_filename(username: str) -> str:
-    return username + "_data.pkl"
+    return _data_path(username + "_data.pkl")
+
+
+def default_storage(username: str) -> UserStorage:
+    """ Returns storage of the selected storage engine for given user """
+    os.makedirs(data_directory, exist_ok=True)
+    if storage_engine == SQLITE_ENGINE:
+        return SqliteStorage(_data_path(sqlite_filename), username)
+    return JournalStorage(_user_filename(username))
+
+
+def users_manifest() -> UsersManifest:
+    """ Returns manifest of users in the data directory, it is created from the existing user data if it is missing """
+    global _manifest
+    filename = _data_path(manifest_filename)
+    if _manifest is None or _manifest.filename != filename:
+        os.makedirs(data_directory, exist_ok=True)
+        _manifest = UsersManifest(filename, _find_users)
+    return _manifest
+
+
+# Nutrients eaten at consecutive days. amounts and complete are arrays with a row for each day and column for each
+# nutrient, complete indicates if none of the nutrient values were NoneType
+NutrientsHistory = namedtuple("NutrientsHistory", ['dates', 'amounts', 'complete'])
 
 
 class UserData(TypedDict):
     """ Holds data about specific user """
     username: str
     custom_products: list[ProductType]
-    eat_history: dict[QDate, list[Product]]
+    eat_history: dict[Day, list[Product]]
+    daily_totals: dict[Day, NutrientsTotals]
     gender: str
     age: int
     height: float
     weight: float
     limits: Nutrients
+    recent_products: RecentProducts
 
 
 class User:
-    def __init__(self, username: str):
+    def __init__(self, username: str, user_storage: UserStorage = None, eager_days: int | None = 14,
+                 max_paged_days: int = 120):
+        """
+        :param username: Name of the user
+        :param user_storage: Storage for the user data, by default storage of the selected storage engine is used
+        :param eager_days: Number of recent days of the eat history loaded at once, None loads the whole history.
+                           Used only if the storage loads history lazily
+        :param max_paged_days: Maximal number of older days kept loaded after they have been requested
+        """
         self._data: UserData = {"username": username}
+        self._storage = user_storage if user_storage else default_storage(username)
+        self._eager_days = eager_days
+        self._max_paged_days = max_paged_days
+        self._window_start = today()                    # Days from this one on are always loaded
+        self._paged_days: OrderedDict[Day, None] = OrderedDict()     # Older loaded days, least recently used first
+        self._product_index: ProductIndex | None = None     # Built on the first search
+        self._recipe_book: RecipeBook | None = None         # Built on the first update of a custom product
+        self._revision = 0                                  # Incremented on every change of the data
+        self._opened = False                                # Opened before its data was saved the first time
         try:
             self.load_data()
         except FileNotFoundError:
             self._data["custom_products"] = []
             self._data["eat_history"] = {}
+            self._data["daily_totals"] = {}
             self._data["gender"] = ''
             self._data["age"] = 0
             self._data["height"] = 0
             self._data["weight"] = 0
             self._data["limits"] = Nutrients(*(None for _ in Nutrients._fields))
+            self._data["recent_products"] = RecentProducts()
 
     def load_data(self):
-        """ Loads user data from file """
-        with open(_user_filename(self._data["username"]), 'rb') as file:
-            self._data = pickle.load(file)
+        """ Loads user data from the storage """
+        with self._storage.lock:
+            self._data, journal = self._storage.load()
+            self._revision += 1
+            self._data["custom_products"] = [intern_product_type(product_type)
+                                             for product_type in self._data["custom_products"]]
+            self._paged_days.clear()
+            self._product_index = None
+            self._recipe_book = None
+            if self._storage.lazy_history:
+                self._load_window()
+            if "daily_totals" not in self._data:
+                self._count_daily_totals()
+            self._data.setdefault("recent_products", RecentProducts())
+            for operation, args in journal:
+                self._apply(operation, *args)
 
     def save_data(self):
-        """ Saves user data to file """
-        with open(_user_filename(self._data["username"]), 'wb') as file:
-            pickle.dump(self._data, file)
+        """ Saves whole user data to the storage """
+        self._storage.save(self._data)
+        self.update_manifest()
+
+    def close(self):
+        """ Writes all the changes of the user data and updates the entry of the user in the users manifest """
+        self._storage.flush()
+        self.update_manifest()
+
+    def update_manifest(self, used: bool = False):
+        """
+        Updates the entry of the user in the users manifest
+
+        :param used: If True, the user is marked as the last used one
+        """
+        if not self._storage.has_data():
+            self._opened |= used        # Placeholder user, which has not been saved yet
+            return
+        users_manifest().update(self.name, self._storage.filenames(), self.history_range(), used or self._opened)
+        self._opened = False
+
+    def history_range(self) -> tuple[Day, Day] | None:
+        """ Returns the first and the last day with eaten products, None if the eat history is empty """
+        with self._storage.lock:
+            history_days = self._data["daily_totals"].keys()
+            return (min(history_days), max(history_days)) if history_days else None
+
+    def _count_daily_totals(self):
+        """ Counts daily totals from the whole eat history, needed for data saved before they were introduced """
+        history = self._data["eat_history"]
+        if self._storage.lazy_history:
+            history_range = self._storage.history_range()
+            history = self._storage.load_eaten_days(*history_range) if history_range else {}
+            history.update(self._data["eat_history"])
+        self._data["daily_totals"] = {date: ProductsArray(products).totals() for date, products in history.items()
+                                      if products}
+
+    def _mutate(self, operation: str, *args):
+        """ Applies a mutation to the user data and records it in the storage """
+        with self._storage.lock:
+            self._apply(operation, *args)
+            self._storage.record(self._data, operation, *args)
+
+    def _apply(self, operation: str, *args):
+        """ Applies a mutation without recording it, used also for replaying the storage journal """
+        getattr(self, "_apply_" + operation)(*args)
+        self._revision += 1
+
+    def _apply_add_custom_product(self, product_type: ProductType):
+        product_type = intern_product_type(product_type)
+        self._data["custom_products"].append(product_type)
+        if self._product_index is not None:
+            self._product_index.add(product_type)
+        if self._recipe_book is not None:
+            self._recipe_book.add(product_type)
+
+    def _apply_del_custom_product(self, index: int):
+        product_type = self._data["custom_products"].pop(index)
+        if self._recipe_book is not None:
+            self._recipe_book.remove(product_type)
+
+    def _apply_replace_custom_products(self, replacements: list[tuple[int, ProductType]]):
+        for index, product_type in replacements:
+            product_type = intern_product_type(product_type)
+            if self._recipe_book is not None:
+                self._recipe_book.remove(self._data["custom_products"][index])
+                self._recipe_book.add(product_type)
+            self._data["custom_products"][index] = product_type
+            if self._product_index is not None:
+                self._product_index.add(product_type)
+
+    def _apply_add_eaten_product(self, date: Day, product: Product):
+        product.product_type = intern_product_type(product.product_type)
+        self._load_day(date)
+        self._data["eat_history"].setdefault(date, []).append(product)
+        self._data["daily_totals"].setdefault(date, NutrientsTotals()).add(product)
+        if self._product_index is not None:
+            self._product_index.add(product.product_type)
+
+    def _apply_del_eaten_product(self, date: Day, index: int):
+        self._load_day(date)
+        product = self._data["eat_history"][date].pop(index)
+        self._data["daily_totals"][date].remove(product)
+        if self._data["daily_totals"][date].products_count == 0:
+            self._data["daily_totals"].pop(date)
+
+    def _load_window(self):
+        """ Loads recent days of the eat history """
+        if self._eager_days is None:
+            history_range = self._storage.history_range()
+            self._window_start = history_range[0] if history_range else today()
+        else:
+            self._window_start = today() - self._eager_days
+        self._data["eat_history"] = self._storage.load_eaten_days(self._window_start, LAST_DAY)
+
+    def _is_loaded(self, date: Day) -> bool:
+        return not self._storage.lazy_history or date >= self._window_start or date in self._paged_days
+
+    def _load_day(self, date: Day):
+        """ Loads products eaten at given date, if they are not loaded yet """
+        if date in self._paged_days:
+            self._paged_days.move_to_end(date)
+        elif not self._is_loaded(date):
+            self._data["eat_history"][date] = self._storage.load_eaten_products(date)
+            self._paged_days[date] = None
+            self._release_old_days()
+
+    def _release_old_days(self):
+        """ Unloads least recently used days, if there are more than max_paged_days days loaded outside the window """
+        while len(self._paged_days) > self._max_paged_days:
+            date, _ = self._paged_days.popitem(last=False)
+            self._storage.release_day(date, self._data["eat_history"].pop(date))
+
+    def _apply_set_user_parameters(self, gender: str, age: int, height: float, weight: float):
+        self._data["gender"] = gender
+        self._data["age"] = age
+        self._data["height"] = height
+        self._data["weight"] = weight
+
+    def _apply_set_limits(self, limits: Nutrients):
+        self._data["limits"] = limits
+
+    def _apply_use_product(self, product_type: ProductType):
+        self._data["recent_products"].use(product_type)
+
+    # Recent products are product types recently chosen by the user in the dialogs, kept between sessions
+    @property
+    def recent_products(self) -> RecentProducts:
+        return self._data["recent_products"]
+
+    def use_product(self, product_type: ProductType):
+        """ Marks product type as recently used """
+        self._mutate("use_product", product_type)
 
     # Custom products are the products created and described by the user
     def get_custom_products(self) -> list[ProductType]:
         return self._data["custom_products"]
 
     def create_add_custom_product(self, food_name: str, **nutrients):
-        self._data["custom_products"].append(ProductType(name=food_name, nutrients=nutrients))
-        self.save_data()
+        self.add_custom_product(ProductType(name=food_name, nutrients=nutrients))
 
     def add_custom_product(self, product_type: ProductType):
-        self._data["custom_products"].append(product_type)
-        self.save_data()
+        self._mutate("add_custom_product", product_type)
 
     def del_custom_product(self, index: int):
-        self._data["custom_products"].pop(index)
-        self.save_data()
+        self._mutate("del_custom_product", index)
+
+    def update_custom_product(self, index: int, product_type: ProductType):
+        """
+        Replaces custom product with given one. Custom combined products containing the replaced one (also indirectly)
+        are combined again, products eaten before stay unchanged
+        """
+        with self._storage.lock:
+            if self._recipe_book is None:
+                self._recipe_book = RecipeBook(self._data["custom_products"])
+            replaced = self._recipe_book.recombined(self._data["custom_products"][index], product_type)
+            replacements = [(idx, replaced[custom_product.content_id()])
+                            for idx, custom_product in enumerate(self._data["custom_products"])
+                            if custom_product.content_id() in replaced]
+            self._mutate("replace_custom_products", replacements)
+
+    def search_products(self, query: str, limit: int = 20) -> list[ProductType]:
+        """
+        Finds product types with names similar to the query among custom products and all the products ever eaten
+
+        :param query: Name of the product, typos are tolerated
+        :param limit: Maximal number of returned product types
+        :return: Product types ordered from the best match
+        """
+        with self._storage.lock:
+            if self._product_index is None:
+                self._product_index = ProductIndex(self._data["custom_products"])
+                history = self._data["eat_history"]
+                history_range = self._storage.history_range() if self._storage.lazy_history else None
+                if history_range:
+                    # Older days are only scanned, they are not kept loaded
+                    history = {**self._storage.load_eaten_days(*history_range), **history}
+                for products in history.values():
+                    for product in products:
+                        self._product_index.add(product.product_type)
+            return self._product_index.search(query, limit)
 
     # Eaten products are products that user claimed that he ate
-    def get_eaten_products(self, from_date: QDate = current_date()) -> list[Product]:
-        return self._data["eat_history"].setdefault(from_date, [])
+    def get_eaten_products(self, from_date: Day = None) -> list[Product]:
+        """ Returns the list kept in the eat history, so it includes products added to the date later """
+        from_date = today() if from_date is None else from_date
+        with self._storage.lock:
+            self._load_day(from_date)
+            return self._data["eat_history"].setdefault(from_date, [])
 
-    def create_add_eaten_product(self, product_type: ProductType, weight: float):
-        self._data["eat_history"].setdefault(current_date(), []).append(
-            Product(product_type=product_type, weight=weight))
-        self.save_data()
+    def create_add_eaten_product(self, product_type: ProductType, weight: float, date: Day = None):
+        self.add_eaten_product(Product(product_type=product_type, weight=weight), date)
 
-    def add_eaten_product(self, product: Product):
-        self._data["eat_history"].setdefault(current_date(), []).append(product)
-        self.save_data()
+    def add_eaten_product(self, product: Product, date: Day = None):
+        self._mutate("add_eaten_product", today() if date is None else date, product)
 
-    def del_eaten_product(self, index: int):
-        self._data["eat_history"][current_date()].pop(index)
-        self.save_data()
+    def del_eaten_product(self, index: int, date: Day = None):
+        self._mutate("del_eaten_product", today() if date is None else date, index)
 
-    def count_nutrients(self, nutrient_idx: int, date: QDate = current_date()) -> tuple[float, bool]:
+    def count_nutrients(self, nutrient_idx: int, date: Day = None) -> tuple[float, bool]:
         """
         :param nutrient_idx: Index of the nutrient to count
-        :param date: Date for which nutrients will be counted
+        :param date: Day for which nutrients will be counted, today by default
         :return: tuple in a form (amount, correct) where:
             amount - amount of selected nutrient eaten at selected date
             correct - bool value indicating if none of the nutrient values were NoneType
         """
-        if date not in self._data["eat_history"].keys():
+        date = today() if date is None else date
+        if date not in self._data["daily_totals"]:
             return 0, True
-        nutrient_values = [product.product_type.nutrients[nutrient_idx] * product.weight / 100
-                           for product in self._data["eat_history"][date]
-                           if product.product_type.nutrients[nutrient_idx] is not None]
-        return sum(nutrient_values), len(nutrient_values) == len(self._data["eat_history"][date])
+        return self._data["daily_totals"][date].nutrient(nutrient_idx)
+
+    def nutrients_history(self, first: Day, last: Day = None) -> NutrientsHistory:
+        """ Returns all nutrients eaten at every day between first and last day (inclusive), based on daily totals """
+        import numpy as np
+        dates = list(range(first, (today() if last is None else last) + 1))
+        totals = [self._data["daily_totals"].get(date, _EMPTY_TOTALS) for date in dates]
+        amounts = np.array([day_totals.amounts for day_totals in totals]).reshape(len(dates), len(Nutrients._fields))
+        unknown_counts = np.array([day_totals.unknown_counts for day_totals in totals])
+        return NutrientsHistory(dates, amounts, unknown_counts.reshape(amounts.shape) == 0)
 
     def set_user_parameters(self, gender: str, age: int, height: float, weight: float):
         """ Sets user parameters to given values """
-        self._data["gender"] = gender
-        self._data["age"] = age
-        self._data["height"] = height
-        self._data["weight"] = weight
-        self.save_data()
+        self._mutate("set_user_parameters", gender, age, height, weight)
 
     def set_limits(self, limits: Nutrients):
-        self._data["limits"] = limits
-        self.save_data()
+        self._mutate("set_limits", limits)
 
     @property
     def get_ppm(self) -> float | None:
@@ -126,6 +365,11 @@ class User:
         return None
 
     # Getters
+    @property
+    def revision(self) -> int:
+        """ Number changed whenever the user data changes, used for invalidating data derived from it """
+        return self._revision
+
     @property
     def name(self):
         return self._data.get("username", "")
@@ -152,11 +396,50 @@ class User:
 
 
 def get_available_users() -> list[str]:
-    """ Finds all users, whose data is available """
-    matched_filenames = [re.match(r'(.*)_data\.pkl', file) for file in os.listdir()]
+    """ Returns names of all users from the users manifest """
+    return users_manifest().names()
+
+
+def last_used_user() -> str | None:
+    """ Returns name of the user opened most recently, None if it is not known """
+    return users_manifest().last_used()
+
+
+def recently_used_users() -> list[str]:
+    """ Returns names of users in order of their last opening, the most recently opened first """
+    return users_manifest().recently_used()
+
+
+def _find_users() -> list[tuple[str, str]]:
+    """ Finds (name, filename) of all users, whose data is available, used only if there is no users manifest """
+    if storage_engine == SQLITE_ENGINE:
+        db_filename = _data_path(sqlite_filename)
+        return [(username, db_filename) for username in sqlite_storage.usernames(db_filename)]
+    return [(username, _user_filename(username)) for username in _pickled_users()]
+
+
+def _pickled_users() -> list[str]:
+    """ Finds all users, whose data is saved in pickle files """
+    matched_filenames = [re.match(r'(.*)_data\.pkl', file) for file in os.listdir(data_directory)]
     return [m.group(1) for m in matched_filenames if m]
 
 
+def migrate_to_sqlite(db_filename: str = None) -> list[str]:
+    """
+    Copies data of all users saved in *_data.pkl files into the SQLite database. Pickle files are left untouched
+
+    :param db_filename: Name of the database file, by default sqlite_filename
+    :return: Names of migrated users
+    """
+    db_filename = db_filename if db_filename else _data_path(sqlite_filename)
+    usernames = _pickled_users()
+    for username in usernames:
+        pickled_user = User(username, JournalStorage(_user_filename(username)), eager_days=None)
+        SqliteStorage(db_filename, username).save(pickled_user._data)
+        users_manifest().update(username, [db_filename], pickled_user.history_range())
+    return usernames
+
+
 if __name__ == '__main__':
     """ testing functionalities """
     user = User("jedrzej")
@@ -167,4 +450,4 @@ if __name__ == '__main__':
     print(user.get_eaten_products())
     print(get_available_users())
 
-    print(user.count_nutrients(0, current_date().addDays(-1)))
+    print(user.count_nutrients(0, today() - 1))
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import threading
+import weakref
+
+from user import User
+
+# Alive users opened by any cache, by their names. Only one User of a name can be opened at a time
+_opened: weakref.WeakValueDictionary[str, User] = weakref.WeakValueDictionary()
+_opened_lock = threading.Lock()
+
+
+def _opened_user(name: str) -> User | None:
+    with _opened_lock:
+        return _opened.get(name)
+
+
+def _register(user: User):
+    with _opened_lock:
+        _opened[user.name] = user
+
+
+class UserCache:
+    """
+    Bounded cache of opened users. Users likely to be opened next are loaded into it by a background thread, so that
+    switching to them does not wait for reading their data. A user taken from the cache is not kept in it until it is
+    put back, so the same data is never loaded twice and the cached users are as fresh as their last use.
+    Users dropped from the cache, but still referenced elsewhere (e.g. by a dialog), are reused instead of loaded again
+    """
+    def __init__(self, capacity: int = 4, create_user=User):
+        """
+        :param capacity: Maximal number of cached users, that are not in use
+        :param create_user: Function creating a user of given name, User by default
+        """
+        self.capacity = capacity
+        self._create_user = create_user
+        self._users: OrderedDict[str, User] = OrderedDict()    # Least recently used first
+        self._taken: set[str] = set()                           # Names of users in use
+        self._loading: str | None = None                        # Name of the user loaded in the background
+        self._queue: list[str] = []                             # Names of users waiting for preloading
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def __contains__(self, name: str) -> bool:
+        with self._condition:
+            return name in self._users
+
+    def get(self, name: str) -> User:
+        """
+        Takes the user out of the cache, the user is loaded if it is not cached. If it is being loaded in the
+        background, waits for the loading instead of loading it again
+
+        :param name: Name of the user
+        :return: User, that should be put back to the cache when it is no longer used
+        """
+        with self._condition:
+            while self._loading == name:
+                self._condition.wait()
+            self._taken.add(name)
+            user = self._users.pop(name, None) or _opened_user(name)
+        if user is None:
+            try:
+                user = self._create_user(name)
+            except BaseException:
+                with self._condition:
+                    self._taken.discard(name)
+                raise
+            _register(user)
+        return user
+
+    def put(self, user: User):
+        """ Closes the user, that is no longer used and keeps it in the cache """
+        user.close()
+        with self._condition:
+            self._taken.discard(user.name)
+            self._store(user)
+
+    def preload(self, names: list[str]):
+        """
+        Loads users in the background, replaces the users waiting for preloading from previous calls
+
+        :param names: Names of users in order of the preloading, only first capacity of them are loaded
+        """
+        with self._condition:
+            self._queue = list(names[:self.capacity])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="users preloader", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _store(self, user: User):
+        self._users[user.name] = user
+        self._users.move_to_end(user.name)
+        while len(self._users) > self.capacity:
+            self._users.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                name = self._queue.pop(0)
+                if name in self._taken or name in self._users or _opened_user(name) is not None:
+                    continue
+                self._loading = name
+            user = None
+            try:
+                user = self._create_user(name)
+            except Exception:
+                pass    # The error is raised again, when the user is opened
+            with self._condition:
+                self._loading = None
+                if user is not None:
+                    _register(user)
+                # Preloaded users are less likely to be used than the ones used before
+                if user is not None and len(self._users) < self.capacity:
+                    self._users[name] = user
+                    self._users.move_to_end(name, last=False)
+                self._condition.notify_all()
+
+
+if __name__ == '__main__':
+    """ testing functionalities """
+    import os
+    import tempfile
+    import time
+    from products import Product, ProductType
+    from days import today
+    import user
+
+    user.data_directory = tempfile.mkdtemp()
+    for username in ("first", "second", "third"):
+        created = User(username)
+        for day in range(today() - 365, today() + 1):
+            for idx in range(5):
+                created.add_eaten_product(Product(ProductType(f"product {idx}", nf_calories=idx), 100), day)
+        created.close()
+    del created     # Only one User of a name can be opened at a time
+
+    start = time.perf_counter()
+    User("second")
+    print(f"loading a user: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    cache = UserCache()
+    cache.preload(["second", "third"])
+    time.sleep(1)
+    start = time.perf_counter()
+    cached = cache.get("second")
+    print(f"taking a preloaded user: {(time.perf_counter() - start) * 1000:.3f} ms, {len(cached.get_eaten_products())} "
+          f"products today, cached: {sorted(cache._users)}, files: {sorted(os.listdir(user.data_directory))}")
@@ -0,0 +1,81 @@
+from collections import namedtuple
+import json
+import os
+import threading
+import time
+
+from days import Day
+from storage import atomic_write
+
+# Entry of the manifest. filename is the file with the user data, size is the size of user data files in bytes,
+# last_used is a timestamp of the last opening of the user, first_day and last_day bound the eat history (or are None)
+UserEntry = namedtuple("UserEntry", ['name', 'filename', 'size', 'last_used', 'first_day', 'last_day'])
+
+
+class UsersManifest:
+    """
+    Small JSON index of users, so they can be listed without scanning the data directory or loading their data.
+    Entries are kept in the order in which users were added
+    """
+    def __init__(self, filename: str, find_users=None):
+        """
+        :param filename: Name of the manifest file
+        :param find_users: Function returning list of (name, filename) of existing users, used for creating the
+                           manifest if its file does not exist
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._entries: dict[str, UserEntry] = {}
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                self._entries = {entry["name"]: UserEntry(**entry) for entry in json.load(file)["users"]}
+        except FileNotFoundError:
+            if find_users is not None:
+                for name, user_filename in find_users():
+                    self._entries[name] = UserEntry(name, user_filename, _size(user_filename), 0, None, None)
+                self._save()
+
+    def entries(self) -> list[UserEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def names(self) -> list[str]:
+        return [entry.name for entry in self.entries()]
+
+    def last_used(self) -> str | None:
+        """ Returns name of the user opened most recently, None if no user has been opened yet """
+        used = self.recently_used()
+        return used[0] if used else None
+
+    def recently_used(self) -> list[str]:
+        """ Returns names of users, that have been opened, the most recently opened first """
+        used = [entry for entry in self.entries() if entry.last_used]
+        return [entry.name for entry in sorted(used, key=lambda entry: entry.last_used, reverse=True)]
+
+    def update(self, name: str, filenames: list[str], history_range: tuple[Day, Day] | None, used: bool = False):
+        """
+        Adds or updates entry of the user and saves the manifest
+
+        :param name: Name of the user
+        :param filenames: Files with the user data, the first one is the main one
+        :param history_range: The first and the last day of the eat history, None if it is empty
+        :param used: If True, the user is marked as the last used one
+        """
+        with self._lock:
+            previous = self._entries.get(name)
+            last_used = time.time() if used else (previous.last_used if previous else 0)
+            first_day, last_day = history_range if history_range else (None, None)
+            self._entries[name] = UserEntry(name, filenames[0], sum(_size(filename) for filename in filenames),
+                                            last_used, first_day, last_day)
+            self._save()
+
+    def _save(self):
+        payload = json.dumps({"users": [entry._asdict() for entry in self._entries.values()]}, indent=1)
+        atomic_write(self.filename, payload.encode('utf-8'))
+
+
+def _size(filename: str) -> int:
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0